@@ -0,0 +1,54 @@
+import traceback
+
+class AccountInventory:
+    """
+    One snapshot of the organization's accounts, listed once and shared by every collector.
+
+    Accounts keep the order ListAccounts returned them in. Names are not unique
+    in an organization, so the name and status indexes map to lists of accounts.
+    """
+
+    def __init__(self, accounts):
+        self.accounts = list(accounts)
+        self.by_id = {}
+        self.by_name = {}
+        self.by_status = {}
+        for account in self.accounts:
+            self.by_id[account['Id']] = account
+            self.by_name.setdefault(account['Name'], []).append(account)
+            self.by_status.setdefault(account['Status'], []).append(account)
+
+    @classmethod
+    def from_organizations(cls, client):
+        """
+        Build the inventory from a single paginated ListAccounts pass.
+
+        Errors are raised rather than turned into an empty inventory, so the
+        stages that need the accounts are skipped instead of writing empty output.
+        """
+        try:
+            print("Fetching AWS accounts...")
+            accounts = []
+            paginator = client.get_paginator('list_accounts')
+            for page in paginator.paginate():
+                accounts.extend(page['Accounts'])
+            return cls(accounts)
+        except Exception as e:
+            print("Error while building the account inventory:")
+            traceback.print_exc()
+            raise
+
+    def get(self, account_id):
+        return self.by_id.get(account_id)
+
+    def with_name(self, name):
+        return self.by_name.get(name, [])
+
+    def with_status(self, status):
+        return self.by_status.get(status, [])
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def __len__(self):
+        return len(self.accounts)
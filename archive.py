@@ -0,0 +1,112 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
+# Output files are buffered in memory up to this size before spilling to a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Compression modes for the output zip, as (zipfile compression, compresslevel)
+COMPRESSION_MODES = {
+    'deflated': (zipfile.ZIP_DEFLATED, None),
+    'fast': (zipfile.ZIP_DEFLATED, 1),
+    'stored': (zipfile.ZIP_STORED, None),
+}
+
+_active_sink = None
+
+class _ArchiveMemberWriter(io.TextIOWrapper):
+    """Text file that is added to the archive as a single member when it is closed."""
+
+    def __init__(self, sink, arcname, encoding, newline):
+        super().__init__(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE), encoding=encoding, newline=newline)
+        self._sink = sink
+        self._arcname = arcname
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.buffer.seek(0)
+            self._sink.add_member(self._arcname, self.buffer)
+        super().close()
+
+class ArchiveSink:
+    """
+    Zip archive that collectors write into directly instead of an output folder.
+
+    Paths under root_directory passed to open_output become members of the
+    archive, so nothing has to be zipped or deleted at the end. The archive is
+    written next to zip_file_path and only moved onto it by close(), so a run
+    that fails part way leaves the last complete archive in place.
+    """
+
+    def __init__(self, zip_file_path, root_directory, compression='deflated'):
+        zip_compression, compresslevel = COMPRESSION_MODES[compression]
+        self.zip_file_path = zip_file_path
+        self.root_directory = os.path.abspath(root_directory)
+        self._temp_file_path = f"{zip_file_path}.{os.getpid()}.tmp"
+        self._zip = zipfile.ZipFile(self._temp_file_path, 'w', zip_compression, compresslevel=compresslevel)
+        # zipfile can only write one member at a time
+        self._lock = threading.Lock()
+
+    def arcname(self, path):
+        """Return the archive member name for path, or None if path is outside the archive root."""
+        relative_path = os.path.relpath(os.path.abspath(path), self.root_directory)
+        if relative_path == os.curdir or relative_path.startswith(os.pardir):
+            return None
+        return relative_path.replace(os.sep, '/')
+
+    def open(self, arcname, encoding='utf-8', newline=None):
+        return _ArchiveMemberWriter(self, arcname, encoding, newline)
+
+    def add_member(self, arcname, source):
+        """Copy a binary file object into the archive as arcname."""
+        # Opening by name would stamp the member 1980-01-01, incremental runs read the real time back
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        info.compress_type = self._zip.compression
+        info._compresslevel = self._zip.compresslevel
+        with self._lock:
+            with self._zip.open(info, 'w', force_zip64=True) as member:
+                shutil.copyfileobj(source, member)
+
+    def close(self):
+        """Finish the archive and move it onto zip_file_path."""
+        self._zip.close()
+        os.replace(self._temp_file_path, self.zip_file_path)
+
+    def discard(self):
+        """Drop the partly written archive, leaving whatever was at zip_file_path untouched."""
+        self._zip.close()
+        os.remove(self._temp_file_path)
+
+    def __enter__(self):
+        global _active_sink
+        _active_sink = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        global _active_sink
+        _active_sink = None
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def open_output(path, mode='w', newline=None, encoding='utf-8'):
+    """Open an output file for writing, as an archive member if an ArchiveSink is active and covers path."""
+    if mode != 'w':
+        raise ValueError(f"open_output only supports mode 'w', got {mode!r}")
+
+    sink = _active_sink
+    if sink is not None:
+        arcname = sink.arcname(path)
+        if arcname is not None:
+            return sink.open(arcname, encoding=encoding, newline=newline)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(path, mode, newline=newline, encoding=encoding)
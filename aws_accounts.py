@@ -1,7 +1,8 @@
 import csv
-import os
-import boto3
 import traceback
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+from archive import open_output
+from aws_clients import get_client
 
 rootAccountId = ''  # Can be avoided if not used elsewhere
 
@@ -36,14 +37,11 @@ def identify_root_account(client):
 def write_accounts_to_csv(accounts, root_account_id, file_name):
     """Write AWS account details to a CSV file."""
     try:
-        # Ensure the output directory exists
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        
         # Define the header for the CSV file
         header = ['Account ID', 'Account Name', 'Email', 'Status', 'Root Account']
 
         # Open the CSV file for writing
-        with open(file_name, mode='w', newline='') as file:
+        with open_output(file_name, mode='w', newline='') as file:
             writer = csv.writer(file)
             
             # Write the header
@@ -66,12 +64,13 @@ def write_accounts_to_csv(accounts, root_account_id, file_name):
         print("An unexpected error occurred while writing to CSV:")
         traceback.print_exc()
 
-def get_account_details(client, output_directory):
-    """Main function to fetch accounts and write them to a CSV file."""
+def get_account_details(client, output_directory, accounts=None):
+    """Main function to fetch accounts and write them to a CSV file. Returns the accounts, or None on failure."""
     try:
-        # Step 1: Get AWS accounts and root account
-        print("Fetching AWS accounts...")
-        accounts = get_aws_accounts(client)
+        # Step 1: Get AWS accounts, unless they were already listed, and root account
+        if accounts is None:
+            print("Fetching AWS accounts...")
+            accounts = get_aws_accounts(client)
         if not accounts:
             print("No accounts retrieved. Exiting.")
             return
@@ -84,6 +83,7 @@ def get_account_details(client, output_directory):
         # Step 2: Write AWS accounts to CSV
         print("Writing AWS accounts to CSV...")
         write_accounts_to_csv(accounts, root_account_id, f'{output_directory}/aws_accounts.csv')
+        return accounts
         
     except NoCredentialsError:
         print("AWS credentials not found.")
@@ -99,7 +99,7 @@ def get_account_details(client, output_directory):
 if __name__ == "__main__":
     try:
         # Create a Boto3 client for Organizations
-        client = boto3.client('organizations')
+        client = get_client('organizations')
         
         # Define the output directory for CSV
         output_directory = './output'
@@ -0,0 +1,26 @@
+import threading
+import boto3
+from aws_throttle import create_client
+
+_session = None
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(service, region_name=None, config=None):
+    """
+    Return a shared boto3 client for the service and region, built on first use.
+
+    Clients are safe to share between threads but boto3 sessions are not,
+    so building clients is serialized here. Every client retries throttling
+    and shares the process-wide rate limiter. config is a botocore Config
+    merged over the shared one. Pass a module-level constant, because clients
+    are cached per config object.
+    """
+    global _session
+    key = (service, region_name, config)
+    with _clients_lock:
+        if key not in _clients:
+            if _session is None:
+                _session = boto3.session.Session()
+            _clients[key] = create_client(_session, service, region_name, config)
+        return _clients[key]
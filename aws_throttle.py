@@ -0,0 +1,156 @@
+import threading
+import time
+from botocore.config import Config
+
+# Attempts per request, including the first, before the error reaches the caller
+MAX_ATTEMPTS = 10
+
+# Every client retries throttling and transient errors with jittered exponential backoff
+CLIENT_CONFIG = Config(retries={'mode': 'standard', 'max_attempts': MAX_ATTEMPTS})
+
+# Starting requests per second for each service in a region. A budget is halved whenever
+# AWS throttles it and grows back as calls succeed, so these only need to be in the right range.
+# Services not listed here, like S3, SQS, SNS, ECR and EC2, are not paced and rely on retries alone.
+SERVICE_RATES = {
+    'organizations': 4,
+    'ce': 5,
+    'iam': 15,
+    'sso-admin': 20,
+    'identitystore': 20,
+    'sts': 20,
+    'ram': 20,
+}
+
+# Budgets for single APIs that are throttled harder than the rest of their service
+OPERATION_RATES = {
+    ('iam', 'GetAccountAuthorizationDetails'): 2,
+    ('ce', 'GetCostAndUsage'): 5,
+    ('organizations', 'ListTargetsForPolicy'): 2,
+    ('organizations', 'DescribePolicy'): 2,
+}
+
+# Services with one endpoint for the whole account, so every region shares their budget
+GLOBAL_SERVICES = frozenset(['iam', 'organizations', 'ce'])
+
+# The codes botocore's standard retry mode treats as throttling, they shrink the budgets that were hit
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'TransactionInProgressException',
+    'RequestLimitExceeded',
+    'BandwidthLimitExceeded',
+    'LimitExceededException',
+    'RequestThrottled',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException',
+])
+
+class TokenBucket:
+    """
+    Token bucket whose rate adapts to throttling: halved on each throttled call,
+    raised a little on each successful one, never above the configured rate.
+    """
+
+    def __init__(self, rate, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.min_rate = min(min_rate, self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until it is available. Waiting callers are served in arrival order."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # The token is reserved now, so the lock is not held while sleeping
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+class RateLimiter:
+    """
+    Shared per-service and per-API request budgets for every boto3 client in the process.
+
+    attach() hooks a client so each attempt, retries included, waits for the
+    budgets of its service and API, where they have one, and so throttling
+    responses shrink the budgets that were hit. Retrying is left to botocore.
+    """
+
+    def __init__(self, service_rates=None, operation_rates=None):
+        self.service_rates = SERVICE_RATES if service_rates is None else service_rates
+        self.operation_rates = OPERATION_RATES if operation_rates is None else operation_rates
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, rate):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rate)
+            return self._buckets[key]
+
+    def buckets_for(self, service, region, operation):
+        """Return the buckets a call has to pass, service budget first, empty for services without a budget."""
+        scope = None if service in GLOBAL_SERVICES else region
+        buckets = []
+        service_rate = self.service_rates.get(service)
+        if service_rate is not None:
+            buckets.append(self._bucket((service, scope), service_rate))
+        operation_rate = self.operation_rates.get((service, operation))
+        if operation_rate is not None:
+            buckets.append(self._bucket((service, scope, operation), operation_rate))
+        return buckets
+
+    def attach(self, client):
+        """Route every request made by client through the shared budgets and return the client."""
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name
+
+        def before_request(operation_name, **kwargs):
+            for bucket in self.buckets_for(service, region, operation_name):
+                bucket.acquire()
+
+        def after_attempt(response, operation, **kwargs):
+            if response is None:
+                return None
+            error_code = response[1].get('Error', {}).get('Code')
+            buckets = self.buckets_for(service, region, operation.name)
+            if error_code in THROTTLING_ERROR_CODES:
+                for bucket in buckets:
+                    bucket.throttled()
+            elif error_code is None:
+                for bucket in buckets:
+                    bucket.succeeded()
+            return None
+
+        # before-sign fires once per attempt right before the request is signed, so waiting here
+        # can't leave a stale signature. needs-retry fires after each attempt's response, this
+        # handler only observes it and returns None so botocore's retry handler still decides.
+        client.meta.events.register('before-sign', before_request)
+        client.meta.events.register('needs-retry', after_attempt)
+        return client
+
+# One limiter for the whole process, so parallel collectors share their budgets
+RATE_LIMITER = RateLimiter()
+
+def create_client(session, service, region_name=None, config=None):
+    """Build a client from session with the shared retry settings and rate limiter."""
+    config = CLIENT_CONFIG if config is None else CLIENT_CONFIG.merge(config)
+    return RATE_LIMITER.attach(session.client(service, region_name=region_name, config=config))
@@ -3,11 +3,13 @@ import boto3
 import csv
 from datetime import datetime, timedelta
 import traceback
+from aws_clients import get_client
+from archive import open_output
 
 def get_all_accounts():
     """Retrieve all AWS accounts in the organization."""
     try:
-        org_client = boto3.client('organizations')
+        org_client = get_client('organizations')
         accounts = []
 
         paginator = org_client.get_paginator('list_accounts')
@@ -22,7 +24,7 @@ def get_all_accounts():
 def get_cost_and_usage(start_date, end_date, account_id):
     """Retrieve cost and usage data for a specific account from AWS Cost Explorer."""
     try:
-        cost_explorer_client = boto3.client('ce')
+        cost_explorer_client = get_client('ce')
 
         response = cost_explorer_client.get_cost_and_usage(
             TimePeriod={
@@ -47,8 +49,10 @@ def get_cost_and_usage(start_date, end_date, account_id):
 
         return response
     except Exception as e:
+        # Throttling has already been retried by the client, so report the failure instead of returning no data
         print(f"Error in get_cost_and_usage for account {account_id}: {e}")
         print(traceback.format_exc())
+        raise
 
 def parse_cost_data(response, account_id, account_name):
     """Parse the cost and usage data to get service-wise billing."""
@@ -68,12 +72,77 @@ def parse_cost_data(response, account_id, account_name):
         print(f"Unexpected error in parse_cost_data for account {account_id}: {e}")
         print(traceback.format_exc())
 
+def get_cost_and_usage_for_all_accounts(start_date, end_date):
+    """Retrieve service-wise cost for every linked account with a single paginated Cost Explorer query."""
+    try:
+        cost_explorer_client = get_client('ce')
+
+        request = {
+            'TimePeriod': {
+                'Start': start_date,
+                'End': end_date
+            },
+            'Granularity': 'MONTHLY',
+            'Metrics': ['UnblendedCost'],
+            'GroupBy': [
+                {
+                    'Type': 'DIMENSION',
+                    'Key': 'LINKED_ACCOUNT'
+                },
+                {
+                    'Type': 'DIMENSION',
+                    'Key': 'SERVICE'
+                }
+            ]
+        }
+
+        # Groups for one time period can be spread across several pages
+        results_by_time = []
+        while True:
+            response = cost_explorer_client.get_cost_and_usage(**request)
+            results_by_time.extend(response['ResultsByTime'])
+
+            next_page_token = response.get('NextPageToken')
+            if not next_page_token:
+                break
+            request['NextPageToken'] = next_page_token
+
+        return results_by_time
+    except Exception as e:
+        print(f"Error in get_cost_and_usage_for_all_accounts: {e}")
+        print(traceback.format_exc())
+        raise
+
+def split_cost_data_by_account(results_by_time, accounts):
+    """Split results grouped by LINKED_ACCOUNT and SERVICE into per-account billing rows."""
+    try:
+        account_names = {account['Id']: account['Name'] for account in accounts}
+        billing_data = {account['Id']: [] for account in accounts}
+
+        for result in results_by_time:
+            time_period = result['TimePeriod']
+            for group in result['Groups']:
+                account_id, service = group['Keys']
+                amount = group['Metrics']['UnblendedCost']['Amount']
+                # Accounts that left the organization can still show up in the billing period
+                if account_id not in billing_data:
+                    continue
+                billing_data[account_id].append([account_id, account_names[account_id], time_period['Start'], time_period['End'], service, amount])
+
+        return billing_data
+    except KeyError as e:
+        print(f"KeyError in split_cost_data_by_account: {e}")
+        print(traceback.format_exc())
+    except Exception as e:
+        print(f"Unexpected error in split_cost_data_by_account: {e}")
+        print(traceback.format_exc())
+
 def export_to_csv(data, filename):
     """Export the billing data to a CSV file."""
     try:
         header = ['Account ID', 'Account Name', 'Start Date', 'End Date', 'Service', 'Cost']
 
-        with open(filename, mode='w', newline='') as file:
+        with open_output(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
             writer.writerow(header)
             writer.writerows(data)
@@ -104,9 +173,10 @@ if __name__ == "__main__":
             print(f"Fetching billing info for account: {account_name} ({account_id})")
 
             # Step 4: Get the cost and usage data for the account
-            cost_data = get_cost_and_usage(start_date, end_date, account_id)
-            if cost_data is None:
-                continue  # Skip to next account if cost data retrieval failed
+            try:
+                cost_data = get_cost_and_usage(start_date, end_date, account_id)
+            except Exception:
+                continue  # Already logged, skip to next account
 
             # Step 5: Parse the data and add to the final result list
             account_billing_data = parse_cost_data(cost_data, account_id, account_name)
@@ -117,12 +187,17 @@ if __name__ == "__main__":
         print(f"Unexpected error in main: {e}")
         print(traceback.format_exc())
 
-def get_billing_info(output_directory):
-    try:
-        # Ensure the policy content directory exists
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
+def get_billing_info(output_directory, batched=True, accounts=None, previous_bills=None):
+    """
+    Exports last month's service-wise billing for every account to per-account CSV files.
 
+    :param output_directory: The directory where the CSV files will be saved.
+    :param accounts: Accounts already listed from AWS Organizations, fetched again if not given.
+    :param batched: Fetch all accounts with one grouped Cost Explorer query instead of one query per account.
+    :param previous_bills: Callable taking the accounts and the start date and returning billing rows by account ID
+                           from an earlier run, which are written as is instead of queried.
+    """
+    try:
         # Step 1: Get the current date and calculate the first and last day of the previous month
         today = datetime.today()
         first_day_last_month = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
@@ -131,25 +206,61 @@ def get_billing_info(output_directory):
         start_date = first_day_last_month.strftime('%Y-%m-%d')
         end_date = last_day_last_month.strftime('%Y-%m-%d')
 
-        # Step 2: Get all accounts in the organization
-        accounts = get_all_accounts()
+        # Step 2: Get all accounts in the organization, unless they were already listed
+        if accounts is None:
+            accounts = get_all_accounts()
+
+        # Reuse an earlier run's bills and only query Cost Explorer for the accounts it did not cover
+        if previous_bills is not None:
+            reused_bills = previous_bills(accounts, start_date)
+            for account in accounts:
+                if account['Id'] in reused_bills:
+                    export_to_csv(reused_bills[account['Id']], filename=f"{output_directory}/{account['Name']}_{account['Id']}_bill.csv")
+            accounts = [account for account in accounts if account['Id'] not in reused_bills]
+            print(f"Reused billing data for {len(reused_bills)} accounts from the previous assessment")
+            if not accounts:
+                return
+
+        if batched:
+            # Step 3: Fetch every account's billing data in one query and split it per account
+            print(f"Fetching billing data for {len(accounts)} accounts...")
+            results_by_time = get_cost_and_usage_for_all_accounts(start_date, end_date)
+            if results_by_time is None:
+                return
+
+            billing_data = split_cost_data_by_account(results_by_time, accounts)
+            if billing_data is None:
+                return
+
+            for account in accounts:
+                account_id = account['Id']
+                account_name = account['Name']
+                export_to_csv(billing_data[account_id], filename=f'{output_directory}/{account_name}_{account_id}_bill.csv')
+            return
 
         # Step 3: Iterate over each account and get billing data
+        failed_accounts = []
         for account in accounts:
             account_id = account['Id']
             account_name = account['Name']
             print(f"Fetching billing data for account: {account_name} ({account_id})")
 
-            # Step 4: Get the cost and usage data for the account
-            cost_data = get_cost_and_usage(start_date, end_date, account_id)
-            if cost_data is None:
-                continue  # Skip to next account if cost data retrieval failed
+            # Step 4: Get the cost and usage data for the account, the remaining accounts are still fetched if it fails
+            try:
+                cost_data = get_cost_and_usage(start_date, end_date, account_id)
+            except Exception:
+                failed_accounts.append(account_id)
+                continue
 
             # Step 5: Parse the data and add to the final result list
             account_billing_data = parse_cost_data(cost_data, account_id, account_name)
             if account_billing_data is not None:
                 export_to_csv(account_billing_data, filename=f'{output_directory}/{account_name}_{account_id}_bill.csv')
 
+        if failed_accounts:
+            raise RuntimeError(f"Billing data could not be fetched for accounts: {', '.join(failed_accounts)}")
+
     except Exception as e:
         print(f"Unexpected error in get_billing_info: {e}")
         print(traceback.format_exc())
+        raise
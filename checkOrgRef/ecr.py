@@ -1,38 +1,42 @@
 import boto3
-import re
+import sys
+from fanout import get_client, scan_resource_policies
+from policy_matcher import PolicyMatcher, format_matches
 
-def check_organization_references_in_policy(org_id_pattern):
+def list_repository_names(ecr_client):
+    """List every ECR repository name in the client's region, following nextToken."""
+    repo_names = []
+    paginator = ecr_client.get_paginator('describe_repositories')
+    for page in paginator.paginate():
+        repo_names.extend(repo['repositoryName'] for repo in page['repositories'])
+    return repo_names
+
+def get_repository_policy(region, repo_name):
+    ecr_client = get_client('ecr', region)
     try:
-        ecr_client = boto3.client('ecr')
-        # Get all ECR repositories
-        repos = ecr_client.describe_repositories()['repositories']
-        
-        for repo in repos:
-            repo_name = repo['repositoryName']
-            print(f"Checking policy for repository: {repo_name}")
-            
-            try:
-                # Get the repository policy
-                policy = ecr_client.get_repository_policy(repositoryName=repo_name)['policyText']
-                
-                # Check for any organization ID pattern
-                org_id_found = org_id_pattern.search(policy)
-                
-                # Check specifically for the text "PrincipalOrgID"
-                principal_org_id_found = "PrincipalOrgID" in policy
-                
-                # Output results based on findings
-                if org_id_found or principal_org_id_found:
-                    print(f"Organization ID reference found in policy for repository: {repo_name}")
-                    # Print policy for further inspection
-                
-            except ecr_client.exceptions.RepositoryPolicyNotFoundException:
-                print(f"No policy found for repository: {repo_name}")
+        return ecr_client.get_repository_policy(repositoryName=repo_name)['policyText']
+    except ecr_client.exceptions.RepositoryPolicyNotFoundException:
+        return None  # Repositories without a policy cannot reference the organization
+
+def check_organization_references_in_policy(region,matcher):
+    """Return (repository name, matches) for ECR repositories in the region whose policy references an organization."""
+    try:
+        repo_names = list_repository_names(get_client('ecr', region))
+        return scan_resource_policies(
+            repo_names,
+            lambda repo_name: get_repository_policy(region, repo_name),
+            matcher
+        )
                 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        return []
 
 
 def main():
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    check_organization_references_in_policy(org_id_pattern)
+    region = sys.argv[1] if len(sys.argv) > 1 else boto3.Session().region_name
+    for repo_name, matches in check_organization_references_in_policy(region,PolicyMatcher()):
+        print(f"Organization reference found in policy for repository: {repo_name} - {format_matches(matches)}")
+
+if __name__ == "__main__":
+    main()
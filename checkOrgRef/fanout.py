@@ -0,0 +1,60 @@
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Scanners share the assessment's client cache at the repository root, one client per (service, region) for every thread
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aws_clients import get_client
+
+# Most of a scan is spent waiting on the network, so this can be well above the CPU count
+DEFAULT_MAX_WORKERS = 16
+
+def _run_task(func, args):
+    try:
+        return func(*args), None
+    except Exception as e:
+        print(f"Error in {func.__name__}{args}:")
+        print(traceback.format_exc())
+        return None, e
+
+def run_concurrently(tasks, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Run (func, args) tasks on a worker pool.
+
+    Returns a list of (result, error) tuples in the same order as tasks,
+    whatever order the workers finished in.
+    """
+    if not tasks:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        futures = [executor.submit(_run_task, func, args) for func, args in tasks]
+        return [future.result() for future in futures]
+
+def map_concurrently(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Apply func to every item on a worker pool and return the results in item order."""
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        return list(executor.map(func, items))
+
+def scan_resource_policies(resources, get_policy, matcher, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Fetch every resource's policy on a worker pool and return (resource, matches) for flagged resources in input order.
+
+    get_policy(resource) returns the raw policy, or None if the resource has none,
+    and matcher is a PolicyMatcher. New resource-policy scanners only need to
+    supply the resources and get_policy.
+    """
+    def check(resource):
+        try:
+            policy = get_policy(resource)
+            return matcher.find(policy) if policy else []
+        except Exception as e:
+            print(f"An error occurred while checking the policy for {resource}: {str(e)}")
+            return []
+
+    resources = list(resources)
+    resource_matches = map_concurrently(check, resources, max_workers=max_workers)
+    return [(resource, matches) for resource, matches in zip(resources, resource_matches) if matches]
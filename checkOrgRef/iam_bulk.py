@@ -0,0 +1,87 @@
+from fanout import get_client
+from iam_policies import check_iam_policies, get_customer_managed_policies, policy_version_marker
+from iam_roles_trust_policy import check_iam_roles_trust_policy
+from policy_matcher import PolicyMatcher, format_matches
+from policy_store import PolicyStore
+
+# Entity types downloaded by get_account_authorization_details, AWS-managed policies are left out
+AUTHORIZATION_DETAILS_FILTER = ['Role', 'User', 'Group', 'LocalManagedPolicy']
+
+# Up to this many new or changed customer-managed policies are fetched one by one from get_policy_version,
+# with more the whole policy list is downloaded again with the authorization details
+MAX_POLICY_VERSION_FETCHES = 50
+
+def get_account_authorization_details(iam_client, entity_filter=AUTHORIZATION_DETAILS_FILTER):
+    """Download every role, user, group and, by default, customer-managed policy with their documents in one paginated pass."""
+    details = {'RoleDetailList': [], 'UserDetailList': [], 'GroupDetailList': [], 'Policies': []}
+    paginator = iam_client.get_paginator('get_account_authorization_details')
+    for page in paginator.paginate(Filter=entity_filter):
+        for key in details:
+            details[key].extend(page.get(key, []))
+    return details
+
+def get_inline_policy_documents(authorization_details):
+    """Return (owner ARN, policy name, document) for every inline policy on roles, users and groups."""
+    documents = []
+    for detail_list, policy_list in [('RoleDetailList', 'RolePolicyList'),
+                                     ('UserDetailList', 'UserPolicyList'),
+                                     ('GroupDetailList', 'GroupPolicyList')]:
+        for entity in authorization_details[detail_list]:
+            for inline_policy in entity.get(policy_list, []):
+                documents.append((entity['Arn'], inline_policy['PolicyName'], inline_policy['PolicyDocument']))
+    return documents
+
+def check_iam_inline_policies(matcher, authorization_details):
+    """Return ('<owner ARN>:<policy name>', matches) for every inline policy that references an organization."""
+    flagged_policies = []
+    for owner_arn, policy_name, policy_document in get_inline_policy_documents(authorization_details):
+        matches = matcher.find(policy_document)
+        if matches:
+            flagged_policies.append((f"{owner_arn}:{policy_name}", matches))
+    return flagged_policies
+
+def check_iam_authorization_details(matcher, policy_store=None):
+    """
+    Return (name, matches) for every IAM policy, trust policy and inline policy that references an organization.
+
+    All three checks read from one get_account_authorization_details download.
+    Customer-managed policies are listed first: when the PolicyStore already
+    holds all but a few at their current version, they are left out of the
+    download and only the changed ones are fetched. Otherwise they are
+    downloaded with everything else and saved to the store for the next run.
+    """
+    iam_client = get_client('iam')
+    policy_store = policy_store or PolicyStore()
+
+    print("Listing customer-managed IAM policies...")
+    policies = get_customer_managed_policies(iam_client)
+    changed_policies = [policy for policy in policies if not policy_store.has(policy['PolicyId'], policy_version_marker(policy))]
+    fetch_changed_policies = len(changed_policies) <= MAX_POLICY_VERSION_FETCHES
+
+    print("Downloading IAM authorization details...")
+    if fetch_changed_policies:
+        print(f"{len(policies) - len(changed_policies)} customer-managed policies unchanged since the last run, fetching {len(changed_policies)}")
+        entity_filter = [entity for entity in AUTHORIZATION_DETAILS_FILTER if entity != 'LocalManagedPolicy']
+        authorization_details = get_account_authorization_details(iam_client, entity_filter)
+        policy_results = check_iam_policies(matcher, policy_store=policy_store, policies=policies)
+    else:
+        authorization_details = get_account_authorization_details(iam_client)
+        policy_results = check_iam_policies(matcher, authorization_details, policy_store)
+
+    flagged = []
+    flagged.extend((f"Policy: {name}", matches) for name, matches in policy_results)
+    flagged.extend((f"Role trust policy: {name}", matches) for name, matches in check_iam_roles_trust_policy(matcher, authorization_details))
+    flagged.extend((f"Inline policy: {name}", matches) for name, matches in check_iam_inline_policies(matcher, authorization_details))
+    return flagged
+
+def main():
+    flagged = check_iam_authorization_details(PolicyMatcher())
+    if flagged:
+        print("IAM policies containing organization references:")
+        for name, matches in flagged:
+            print(f"- {name}: {format_matches(matches)}")
+    else:
+        print("No IAM policies containing organization references were found.")
+
+if __name__ == "__main__":
+    main()
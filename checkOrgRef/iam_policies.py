@@ -1,5 +1,7 @@
 import boto3
-import re
+from fanout import get_client, map_concurrently
+from policy_matcher import PolicyMatcher, format_matches
+from policy_store import PolicyStore
 
 
 def get_customer_managed_policies(iam_client):
@@ -18,39 +20,86 @@ def get_policy_document(iam_client,policy_arn, version_id):
     )
     return response['PolicyVersion']['Document']
 
-def check_policy_for_org_id(policy_document,org_id_pattern):
-    """Check if the policy document contains an org ID or 'PrincipalOrgID'."""
-    policy_str = str(policy_document)
-    if 'PrincipalOrgID' in policy_str or org_id_pattern.search(policy_str):
-        return True
-    return False
-
-def check_iam_policies(org_id_pattern):
-    iam_client = boto3.client('iam')
-    print("Fetching customer-managed IAM policies...")
-    policies = get_customer_managed_policies(iam_client)
-    flagged_policies = []
+def policy_version_marker(policy):
+    """
+    Return the marker a stored policy document is validated against.
 
-    print(f"Found {len(policies)} customer-managed policies. Checking for organization IDs...")
-    for policy in policies:
-        policy_arn = policy['Arn']
-        default_version_id = policy['DefaultVersionId']
-        policy_document = get_policy_document(iam_client,policy_arn, default_version_id)
-        
-        if check_policy_for_org_id(policy_document,org_id_pattern):
-            flagged_policies.append(policy_arn)
+    UpdateDate alone misses a switch back to an older default version, and the
+    version ID alone restarts at v1, so both are used. Policies from
+    list_policies and get_account_authorization_details carry both fields.
+    """
+    return f"{policy['DefaultVersionId']}@{policy['UpdateDate']}"
 
-    if flagged_policies:
-        print("Policies containing organization IDs or 'PrincipalOrgID':")
-        for policy_arn in flagged_policies:
-            print(f"- {policy_arn}")
+def get_default_policy_documents(authorization_details, policy_store=None):
+    """
+    Return (policy ARN, default version document) pairs from a get_account_authorization_details download.
+
+    The documents are also saved to policy_store when one is given, so later runs can skip the download.
+    """
+    documents = []
+    for policy in authorization_details['Policies']:
+        for version in policy['PolicyVersionList']:
+            if version['IsDefaultVersion']:
+                documents.append((policy['Arn'], version['Document']))
+                if policy_store is not None:
+                    policy_store.put(policy['PolicyId'], policy_version_marker(policy), version['Document'])
+    return documents
+
+def get_stored_policy_documents(policies, policy_store):
+    """
+    Return (policy ARN, default version document) pairs for policies from list_policies.
+
+    Documents the store holds at the policy's current version are read from
+    disk, only the rest are fetched with get_policy_version, concurrently.
+    """
+    def get_document(policy):
+        return policy_store.get_or_fetch(
+            policy['PolicyId'],
+            policy_version_marker(policy),
+            lambda: get_policy_document(get_client('iam'), policy['Arn'], policy['DefaultVersionId'])
+        )
+
+    return list(zip([policy['Arn'] for policy in policies], map_concurrently(get_document, policies)))
+
+def check_iam_policies(matcher, authorization_details=None, policy_store=None, policies=None):
+    """
+    Return (policy ARN, matches) for customer-managed policies that reference an organization.
+
+    With authorization_details from get_account_authorization_details the
+    documents are read from it, and saved to policy_store if one is given.
+    Otherwise the policies are listed, unless already listed, and a PolicyStore
+    serves the ones unchanged since an earlier run, so only changed documents
+    are downloaded.
+    """
+    if authorization_details is not None:
+        policy_documents = get_default_policy_documents(authorization_details, policy_store)
     else:
-        print("No policies containing organization IDs or 'PrincipalOrgID' were found.")
+        if policies is None:
+            print("Fetching customer-managed IAM policies...")
+            policies = get_customer_managed_policies(get_client('iam'))
+        policy_store = policy_store or PolicyStore()
+        policy_documents = get_stored_policy_documents(policies, policy_store)
+    flagged_policies = []
+
+    print("Checking customer-managed IAM policies for organization IDs...")
+    for policy_arn, policy_document in policy_documents:
+        matches = matcher.find(policy_document)
+        if matches:
+            flagged_policies.append((policy_arn, matches))
+
+    if policy_store is not None:
+        policy_store.save()
+    return flagged_policies
 
 def main():
 
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    check_iam_policies(org_id_pattern)
+    flagged_policies = check_iam_policies(PolicyMatcher())
+    if flagged_policies:
+        print("Policies containing organization references:")
+        for policy_arn, matches in flagged_policies:
+            print(f"- {policy_arn}: {format_matches(matches)}")
+    else:
+        print("No policies containing organization references were found.")
 
 
 if __name__ == "__main__":
@@ -1,56 +1,82 @@
 import boto3
-import re
+from fanout import get_client, map_concurrently
+from policy_matcher import PolicyMatcher, format_matches
 
 
-def get_customer_managed_roles(iam_client,org_id_pattern):
-    """Retrieve a list of all customer-managed IAM roles."""
-    roles = []
+def iter_customer_managed_roles(iam_client):
+    """Yield customer-managed IAM roles page by page as list_roles returns them."""
     paginator = iam_client.get_paginator('list_roles')
     for page in paginator.paginate():
         for role in page['Roles']:
             # Include only roles that are customer-managed (exclude AWS-managed roles)
             if not role['Arn'].startswith('arn:aws:iam::aws:role/'):
-                roles.append(role)
-    return roles
+                yield role
+
+def get_customer_managed_roles(iam_client):
+    """Retrieve a list of all customer-managed IAM roles."""
+    return list(iter_customer_managed_roles(iam_client))
 
-def get_trust_policy(iam_client,role_name,org_id_pattern):
+def get_trust_policy(iam_client,role_name):
     """Retrieve the trust relationship policy for a specific role."""
     response = iam_client.get_role(RoleName=role_name)
     return response['Role']['AssumeRolePolicyDocument']
 
-def check_trust_policy_for_org_id(trust_policy,org_id_pattern):
-    """Check if the trust policy contains an org ID or 'PrincipalOrgID'."""
-    policy_str = str(trust_policy)
-    if 'PrincipalOrgID' in policy_str or org_id_pattern.search(policy_str):
-        return True
-    return False
-
-def check_iam_roles_trust_policy(org_id_pattern):
-    iam_client = boto3.client('iam')
-    print("Fetching customer-managed IAM roles...")
-    roles = get_customer_managed_roles(iam_client,org_id_pattern)
+def check_iam_roles_trust_policy(matcher, authorization_details=None):
+    """
+    Return (role ARN, matches) for customer-managed roles whose trust policy references an organization.
+
+    With authorization_details from get_account_authorization_details the
+    roles are read from it instead of from list_roles.
+    """
+    iam_client = get_client('iam')
+    print("Checking customer-managed IAM role trust policies for organization IDs...")
     flagged_roles = []
+    roles_without_policy = []
+    role_count = 0
+
+    if authorization_details is not None:
+        roles = (
+            role for role in authorization_details['RoleDetailList']
+            if not role['Arn'].startswith('arn:aws:iam::aws:role/')
+        )
+    else:
+        roles = iter_customer_managed_roles(iam_client)
 
-    print(f"Found {len(roles)} customer-managed roles. Checking for organization IDs...")
+    # Both the RoleDetailList and the list_roles pages carry each role's trust policy, so roles are checked as they are read
     for role in roles:
-        role_name = role['RoleName']
-        trust_policy = get_trust_policy(iam_client,role_name,org_id_pattern)
-        
-        if check_trust_policy_for_org_id(trust_policy,org_id_pattern):
-            flagged_roles.append(role['Arn'])
+        role_count += 1
+        trust_policy = role.get('AssumeRolePolicyDocument')
+        if trust_policy is None:
+            roles_without_policy.append(role)
+            continue
+        matches = matcher.find(trust_policy)
+        if matches:
+            flagged_roles.append((role['Arn'], matches))
 
-    if flagged_roles:
-        print("Roles containing organization IDs or 'PrincipalOrgID' in trust policies:")
-        for role_arn in flagged_roles:
-            print(f"- {role_arn}")
-    else:
-        print("No roles containing organization IDs or 'PrincipalOrgID' in trust policies were found.")
+    # Fall back to get_role only for roles whose trust policy was missing from the listing or the details
+    if roles_without_policy:
+        trust_policies = map_concurrently(
+            lambda role: get_trust_policy(get_client('iam'),role['RoleName']),
+            roles_without_policy
+        )
+        for role, trust_policy in zip(roles_without_policy, trust_policies):
+            matches = matcher.find(trust_policy)
+            if matches:
+                flagged_roles.append((role['Arn'], matches))
+
+    print(f"Checked {role_count} customer-managed roles.")
+    return flagged_roles
 
 
 def main():
 
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    check_iam_roles_trust_policy(org_id_pattern)
+    flagged_roles = check_iam_roles_trust_policy(PolicyMatcher())
+    if flagged_roles:
+        print("Roles containing organization references in trust policies:")
+        for role_arn, matches in flagged_roles:
+            print(f"- {role_arn}: {format_matches(matches)}")
+    else:
+        print("No roles containing organization references in trust policies were found.")
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,77 @@
 import boto3
+import argparse
 import sys,os,datetime,re
-from utility import get_regions
+from fanout import run_concurrently, DEFAULT_MAX_WORKERS
+from policy_matcher import PolicyMatcher, format_matches
+from utility import get_regions, region_cache
+from region_selection import DEFAULT_COST_THRESHOLD
 from sns import check_organization_references_in_sns_policy
 from sqs import check_organization_references_in_sqs_policy
 from s3 import checks3
-from iam_policies import check_iam_policies
-from iam_roles_trust_policy import check_iam_roles_trust_policy
+from iam_bulk import check_iam_authorization_details
 from ecr import check_organization_references_in_policy
+from vpc_endpoint import check_organization_references_in_vpc_endpoints
 
-regionList = get_regions()
-for region in regionList:
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
+# Checks that cover the whole account and must run only once
+GLOBAL_CHECKS = [
+    ('S3', checks3),
+    ('IAM', check_iam_authorization_details),
+]
 
-    check_organization_references_in_sns_policy(region,org_id_pattern)
-    check_organization_references_in_sqs_policy(region,org_id_pattern)
-    checks3(org_id_pattern)
-    check_iam_roles_trust_policy(org_id_pattern)
-    check_iam_policies(org_id_pattern)
-    check_organization_references_in_policy(org_id_pattern)
+# Checks that only see resources in the region they are called with
+REGIONAL_CHECKS = [
+    ('SNS', check_organization_references_in_sns_policy),
+    ('SQS', check_organization_references_in_sqs_policy),
+    ('ECR', check_organization_references_in_policy),
+    ('VPC endpoints', check_organization_references_in_vpc_endpoints),
+]
 
+def plan_scans(regions):
+    """Build the list of (service, region, check, args) to run: global checks once, regional checks per region."""
+    plan = []
+    for service, check in GLOBAL_CHECKS:
+        plan.append((service, 'global', check, ()))
+    for region in regions:
+        for service, check in REGIONAL_CHECKS:
+            plan.append((service, region, check, (region,)))
+    return plan
 
-        
+def run_scans(plan, matcher, max_workers=DEFAULT_MAX_WORKERS):
+    """Run every planned check concurrently and return (service, region, flagged, error) in plan order."""
+    tasks = [(check, args + (matcher,)) for service, region, check, args in plan]
+    results = run_concurrently(tasks, max_workers=max_workers)
+    return [
+        (service, region, flagged or [], error)
+        for (service, region, check, args), (flagged, error) in zip(plan, results)
+    ]
 
+def print_report(results):
+    for service, region, flagged, error in results:
+        print(f"\n--- {service} ({region}) ---")
+        if error is not None:
+            print(f"Scan failed: {error}")
+        elif flagged:
+            print("Organization references found in:")
+            for resource, matches in flagged:
+                print(f"- {resource}: {format_matches(matches)}")
+        else:
+            print("No organization references found.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check resource policies for organization references.")
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of (service, region) scans to run at once")
+    parser.add_argument('--refresh-regions', action='store_true',
+                        help="Ignore cached region discovery for this account and look the regions up again")
+    parser.add_argument('--cost-threshold', type=float, default=DEFAULT_COST_THRESHOLD,
+                        help="Only scan regions with more than this much spend (USD) in the last 15 days")
+    args = parser.parse_args()
+
+    if args.refresh_regions:
+        region_cache.invalidate(region_cache.get_account_id())
+
+    regionList = get_regions(args.cost_threshold)
+    print_report(run_scans(plan_scans(regionList), PolicyMatcher(), max_workers=args.max_workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import re
+import threading
+from collections import namedtuple
+
+# Condition keys that scope a policy to an organization or part of it, compared case-insensitively
+ORG_CONDITION_KEYS = (
+    'aws:PrincipalOrgID',
+    'aws:PrincipalOrgPaths',
+    'aws:ResourceOrgID',
+    'aws:ResourceOrgPaths',
+    'aws:SourceOrgID',
+    'aws:SourceOrgPaths',
+)
+_ORG_CONDITION_KEYS_LOWER = frozenset(key.lower() for key in ORG_CONDITION_KEYS)
+
+# Org IDs and OU paths that can also appear outside conditions, in Resource or Principal
+ORG_VALUE_PATTERN = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
+
+SET_OPERATOR_QUALIFIERS = ('ForAnyValue:', 'ForAllValues:')
+
+# Analyses kept in memory, identical documents repeat across buckets, queues and roles
+MAX_CACHED_ANALYSES = 10000
+
+# operator is the condition operator as written, operator_family the same without set qualifier or IfExists
+Finding = namedtuple('Finding', ['statement', 'effect', 'principal', 'operator', 'operator_family', 'condition_key', 'values'])
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _describe_principal(statement):
+    for field in ('Principal', 'NotPrincipal'):
+        if field in statement:
+            principal = statement[field]
+            text = principal if isinstance(principal, str) else json.dumps(principal, sort_keys=True)
+            return text if field == 'Principal' else f"NotPrincipal {text}"
+    return None
+
+def _scan_malformed(value):
+    """Return the org condition keys and org IDs found by substring in a block that isn't shaped as IAM expects."""
+    text = json.dumps(value)
+    lowered = text.lower()
+    keys = [key for key in ORG_CONDITION_KEYS if key.lower() in lowered]
+    return tuple(keys + sorted(set(ORG_VALUE_PATTERN.findall(text))))
+
+def base_operator(operator):
+    """Strip the ForAnyValue:/ForAllValues: qualifier and IfExists suffix from a condition operator."""
+    for qualifier in SET_OPERATOR_QUALIFIERS:
+        if operator.startswith(qualifier):
+            operator = operator[len(qualifier):]
+            break
+    if operator.endswith('IfExists'):
+        operator = operator[:-len('IfExists')]
+    return operator
+
+def analyze_document(document):
+    """Return a Finding for every organization-scoped condition or org ID literal in a parsed policy document."""
+    findings = []
+    statements = _as_list(document.get('Statement')) if isinstance(document, dict) else []
+
+    for index, statement in enumerate(statements):
+        if not isinstance(statement, dict):
+            continue
+        statement_name = statement.get('Sid') or f"Statement[{index}]"
+        effect = statement.get('Effect')
+        principal = _describe_principal(statement)
+
+        # Conditions: org keys under any operator, including set-qualified ones.
+        # Malformed blocks are matched by substring so their references are still reported.
+        condition_block = statement.get('Condition')
+        if condition_block is not None and not isinstance(condition_block, dict):
+            values = _scan_malformed(condition_block)
+            if values:
+                findings.append(Finding(statement_name, effect, principal, None, None, 'Condition', values))
+            condition_block = {}
+        for operator, conditions in (condition_block or {}).items():
+            if not isinstance(conditions, dict):
+                values = _scan_malformed(conditions)
+                if values:
+                    findings.append(Finding(statement_name, effect, principal, operator, base_operator(operator), None, values))
+                continue
+            for key, values in conditions.items():
+                values = _as_list(values)
+                if key.lower() in _ORG_CONDITION_KEYS_LOWER or any(
+                        isinstance(value, str) and ORG_VALUE_PATTERN.search(value) for value in values):
+                    findings.append(Finding(statement_name, effect, principal, operator, base_operator(operator), key, tuple(values)))
+
+        # Org IDs and OU paths written straight into resources or principals
+        for field in ('Resource', 'NotResource', 'Principal', 'NotPrincipal'):
+            if field not in statement:
+                continue
+            text = json.dumps(statement[field])
+            values = tuple(sorted(set(ORG_VALUE_PATTERN.findall(text))))
+            if values:
+                findings.append(Finding(statement_name, effect, principal, None, None, field, values))
+
+    return findings
+
+class PolicyAnalyzer:
+    """Parses each distinct policy document once and remembers its findings by content hash."""
+
+    def __init__(self, max_cached=MAX_CACHED_ANALYSES):
+        self._max_cached = max_cached
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, policy, raw=None):
+        """
+        Return the findings for a policy given as raw text, bytes or an already decoded document.
+
+        raw is the policy already serialized by the caller, so decoded documents
+        are not serialized a second time for hashing. Returns None when the
+        policy is not a JSON policy document or its structure can't be walked.
+        """
+        if raw is None:
+            raw = json.dumps(policy, sort_keys=True) if isinstance(policy, (dict, list)) else policy
+        if isinstance(raw, str):
+            raw = raw.encode()
+        digest = hashlib.sha256(raw).hexdigest()
+
+        with self._lock:
+            if digest in self._cache:
+                return self._cache[digest]
+
+        try:
+            document = policy if isinstance(policy, (dict, list)) else json.loads(raw)
+            findings = analyze_document(document)
+        except (ValueError, TypeError, AttributeError):
+            findings = None
+
+        with self._lock:
+            if len(self._cache) >= self._max_cached:
+                self._cache.clear()
+            self._cache[digest] = findings
+        return findings
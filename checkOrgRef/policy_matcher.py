@@ -0,0 +1,74 @@
+import json
+import re
+from policy_analyzer import Finding, PolicyAnalyzer
+
+# Every marker in one alternation, so a policy is scanned once however many markers there are.
+# This is only a prefilter: documents that hit are parsed by the analyzer, which decides what counts.
+ORG_MARKER_PATTERN = (
+    r'(?i:aws:(?:PrincipalOrgID|PrincipalOrgPaths|ResourceOrgID|ResourceOrgPaths|SourceOrgID|SourceOrgPaths))'
+    r'|\bo-[a-zA-Z0-9]{4,32}\b'
+)
+
+class PolicyMatcher:
+    """
+    Finds organization references in policy documents.
+
+    search() is a single regex pass over the raw policy text or bytes. Only
+    policies that hit are handed to the PolicyAnalyzer, which walks their
+    statements and conditions, so a marker in a Sid or description is not
+    reported. One matcher is shared by all scanners so identical documents
+    are analyzed once.
+    """
+
+    def __init__(self, analyzer=None):
+        self._text_pattern = re.compile(ORG_MARKER_PATTERN)
+        self._bytes_pattern = re.compile(ORG_MARKER_PATTERN.encode())
+        self._analyzer = analyzer or PolicyAnalyzer()
+
+    def _raw(self, policy):
+        # Documents that boto3 already decoded are serialized once, in the form the analyzer hashes,
+        # everything else is scanned as returned
+        if isinstance(policy, (dict, list)):
+            return json.dumps(policy, sort_keys=True)
+        return policy
+
+    def _search_raw(self, raw):
+        if not raw:
+            return False
+        pattern = self._bytes_pattern if isinstance(raw, bytes) else self._text_pattern
+        return pattern.search(raw) is not None
+
+    def search(self, policy):
+        """Return True if the policy contains any organization marker."""
+        return self._search_raw(self._raw(policy))
+
+    def find(self, policy):
+        """Return a Finding for every organization reference in the policy, an empty list if there are none."""
+        raw = self._raw(policy)
+        if not self._search_raw(raw):
+            return []
+
+        findings = self._analyzer.analyze(policy, raw)
+        if findings is None:
+            # Not a JSON policy document, or one that can't be walked: report the raw markers without a location
+            if isinstance(raw, bytes):
+                raw = raw.decode(errors='replace')
+            markers = tuple(dict.fromkeys(self._text_pattern.findall(raw)))
+            return [Finding(None, None, None, None, None, None, markers)]
+        return list(findings)
+
+def format_matches(findings):
+    """Render findings as a short human-readable summary."""
+    parts = []
+    for finding in findings:
+        location = finding.statement or 'policy'
+        if finding.effect:
+            location = f"{location} {finding.effect}"
+        if finding.operator:
+            location = f"{location} {finding.operator}"
+            if finding.condition_key:
+                location = f"{location} {finding.condition_key}"
+        elif finding.condition_key:
+            location = f"{location} in {finding.condition_key}"
+        parts.append(f"{', '.join(map(str, finding.values)) or finding.condition_key} ({location})")
+    return '; '.join(parts)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+# The store sits under the region cache's directory at the repository root, override with CK_ASSESSOR_CACHE_DIR
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from region_cache import CACHE_DIRECTORY
+
+POLICY_STORE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'policy_store')
+
+class PolicyStore:
+    """
+    Content-addressed store of policy documents kept between runs.
+
+    Documents are saved once under the SHA-256 of their content. An index maps
+    each resource key to the version marker it was fetched at, so an unchanged
+    document is served from disk instead of being downloaded again. Keys must
+    not be reused by a recreated resource, so IAM policies are keyed by
+    PolicyId rather than ARN.
+    """
+
+    def __init__(self, directory=POLICY_STORE_DIRECTORY):
+        self.directory = directory
+        self._objects_directory = os.path.join(directory, 'objects')
+        self._index_file = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self._index_file, encoding='utf-8') as file:
+                self._index = json.load(file)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_directory, digest[:2], digest)
+
+    def _entry(self, key, version):
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None or version is None or entry['version'] != version:
+            return None
+        return entry
+
+    def has(self, key, version):
+        """Return True if a document for key is stored at version."""
+        entry = self._entry(key, version)
+        return entry is not None and os.path.exists(self._object_path(entry['digest']))
+
+    def get(self, key, version):
+        """Return the stored document for key if it was stored at the same version, otherwise None."""
+        entry = self._entry(key, version)
+        if entry is None:
+            return None
+        try:
+            with open(self._object_path(entry['digest']), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, version, document):
+        """Store a document for key at version and return its content digest."""
+        content = json.dumps(document, sort_keys=True)
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(temp_path, object_path)
+        with self._lock:
+            self._index[key] = {'version': version, 'digest': digest}
+            self._dirty = True
+        return digest
+
+    def get_or_fetch(self, key, version, fetch):
+        """Return the stored document for key at version, calling fetch() and storing the result on a miss."""
+        document = self.get(key, version)
+        if document is None:
+            document = fetch()
+            if document is not None:
+                self.put(key, version, document)
+        return document
+
+    def save(self):
+        """Write the index to disk if anything was stored since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            temp_file = f"{self._index_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump(self._index, file)
+            os.replace(temp_file, self._index_file)
+            self._dirty = False
+
+    def invalidate(self):
+        """Forget every stored version so all documents are fetched again, objects are kept for reuse."""
+        with self._lock:
+            self._index = {}
+            self._dirty = True
+        self.save()
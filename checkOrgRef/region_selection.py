@@ -0,0 +1,25 @@
+# Regions whose recent cost is at or below this amount (USD) are not worth scanning
+DEFAULT_COST_THRESHOLD = 1.0
+
+def sum_costs_by_region(results_by_time):
+    """Total the UnblendedCost of Cost Explorer REGION groups across every time period."""
+    region_costs = {}
+    for result in results_by_time:
+        for group in result['Groups']:
+            region_code = group['Keys'][0]
+            cost = float(group['Metrics']['UnblendedCost']['Amount'])
+            region_costs[region_code] = region_costs.get(region_code, 0.0) + cost
+    return region_costs
+
+def cost_active_regions(region_costs, cost_threshold=DEFAULT_COST_THRESHOLD):
+    """Return the set of regions whose total cost is above cost_threshold."""
+    return {region for region, cost in region_costs.items() if cost > cost_threshold}
+
+def select_regions(region_costs, enabled_regions, cost_threshold=DEFAULT_COST_THRESHOLD):
+    """
+    Return the enabled regions that are cost-active, sorted.
+
+    Cost Explorer also reports pseudo regions such as 'global' and 'NoRegion',
+    which drop out here because describe_regions never lists them.
+    """
+    return sorted(cost_active_regions(region_costs, cost_threshold) & set(enabled_regions))
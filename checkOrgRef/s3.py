@@ -1,18 +1,22 @@
 import boto3
-import re
-import json
 from botocore.exceptions import ClientError
+from fanout import get_client, map_concurrently
+from policy_matcher import PolicyMatcher, format_matches
 
-# Regular expression to match organization IDs
-
-
-# Initialize S3 client
-s3_client = boto3.client('s3')
+# ListBuckets only reports BucketRegion when the request carries a parameter such as MaxBuckets
+BUCKET_PAGE_SIZE = 1000
 
 def get_all_buckets(s3_client):
-    """Retrieve a list of all S3 buckets."""
-    response = s3_client.list_buckets()
-    return [bucket['Name'] for bucket in response['Buckets']]
+    """Retrieve all S3 buckets as (name, region) pairs, region is None when list_buckets doesn't report it."""
+    if s3_client.can_paginate('list_buckets'):
+        # Newer APIs page through buckets and report each bucket's region
+        buckets = []
+        paginator = s3_client.get_paginator('list_buckets')
+        for page in paginator.paginate(PaginationConfig={'PageSize': BUCKET_PAGE_SIZE}):
+            buckets.extend(page['Buckets'])
+    else:
+        buckets = s3_client.list_buckets()['Buckets']
+    return [(bucket['Name'], bucket.get('BucketRegion')) for bucket in buckets]
 
 def get_bucket_region(bucket_name,s3_client):
     """Retrieve the region of a specific S3 bucket."""
@@ -20,50 +24,50 @@ def get_bucket_region(bucket_name,s3_client):
     return response['LocationConstraint'] or 'us-east-1'  # Default to us-east-1 if None
 
 def get_bucket_policy(bucket_name, region,s3_client):
-    """Retrieve the policy document for a specific S3 bucket in the correct region."""
-    regional_s3_client = boto3.client('s3', region_name=region)  # Use a regional client
+    """Retrieve the raw policy text for a specific S3 bucket in the correct region."""
+    regional_s3_client = get_client('s3', region)  # Use a regional client
     try:
         response = regional_s3_client.get_bucket_policy(Bucket=bucket_name)
-        return json.loads(response['Policy'])  # Return the policy document as JSON
+        return response['Policy']  # Left unparsed, the matcher scans the raw text
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchBucketPolicy':
             return None  # No policy exists for this bucket
         else:
             raise  # Reraise other exceptions
 
-def check_policy_for_org_id(policy_document,org_id_pattern):
-    """Check if the policy document contains an org ID or 'PrincipalOrgID'."""
-    policy_str = json.dumps(policy_document)  # Convert policy document to a JSON string
-    return 'PrincipalOrgID' in policy_str or org_id_pattern.search(policy_str)
+def check_bucket(bucket,matcher):
+    """Return the organization references in the bucket's policy, runs on a worker thread."""
+    bucket_name, region = bucket
+    try:
+        s3_client = get_client('s3')
+        if region is None:
+            region = get_bucket_region(bucket_name,s3_client)  # Only needed when list_buckets didn't report it
+        policy_document = get_bucket_policy(bucket_name, region,s3_client)  # Get the policy using the correct region
+
+        return matcher.find(policy_document) if policy_document else []
+
+    except ClientError as e:
+        print(f"Error processing bucket {bucket_name}: {e}")
+        return []
 
-def checks3(org_id_pattern):
-    s3_client = boto3.client('s3')
+def checks3(matcher):
+    """Return (bucket name, matches) for buckets whose policy references an organization."""
+    s3_client = get_client('s3')
     print("Fetching all S3 buckets...")
     buckets = get_all_buckets(s3_client)
-    flagged_buckets = []
 
     print(f"Found {len(buckets)} buckets. Checking for organization IDs in bucket policies...")
-    for bucket_name in buckets:
-        try:
-            region = get_bucket_region(bucket_name,s3_client)  # Get the region of the bucket
-            policy_document = get_bucket_policy(bucket_name, region,s3_client)  # Get the policy using the correct region
-
-            if policy_document and check_policy_for_org_id(policy_document,org_id_pattern):
-                flagged_buckets.append(bucket_name)
-
-        except ClientError as e:
-            print(f"Error processing bucket {bucket_name}: {e}")
+    bucket_matches = map_concurrently(lambda bucket: check_bucket(bucket,matcher), buckets)
+    return [(bucket_name, matches) for (bucket_name, region), matches in zip(buckets, bucket_matches) if matches]
 
+def main():
+    flagged_buckets = checks3(PolicyMatcher())
     if flagged_buckets:
-        print("Buckets containing organization IDs or 'PrincipalOrgID' in policies:")
-        for bucket_name in flagged_buckets:
-            print(f"- {bucket_name}")
+        print("Buckets containing organization references in policies:")
+        for bucket_name, matches in flagged_buckets:
+            print(f"- {bucket_name}: {format_matches(matches)}")
     else:
-        print("No buckets containing organization IDs or 'PrincipalOrgID' in policies were found.")
-
-def main():
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    checks3(org_id_pattern)
+        print("No buckets containing organization references in policies were found.")
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,42 @@
 import boto3
-import re
+import sys
+from fanout import get_client, scan_resource_policies
+from policy_matcher import PolicyMatcher, format_matches
 
 
+def list_topic_arns(sns_client):
+    """List every SNS topic ARN in the client's region, following NextToken."""
+    topic_arns = []
+    paginator = sns_client.get_paginator('list_topics')
+    for page in paginator.paginate():
+        topic_arns.extend(topic['TopicArn'] for topic in page.get('Topics', []))
+    return topic_arns
 
-def check_organization_references_in_sns_policy(region,org_id_pattern):
-    try:
-        sns_client = boto3.client('sns',region_name =region)
-        topics_response = sns_client.list_topics()
-        topics = topics_response.get('Topics', [])
-
-        for topic in topics:
-            topic_arn = topic['TopicArn']
-
-            try:
-                attributes = sns_client.get_topic_attributes(TopicArn=topic_arn)
-                policy = attributes['Attributes'].get('Policy', '')
-
-                org_id_found = org_id_pattern.search(policy)
+def get_topic_policy(region, topic_arn):
+    attributes = get_client('sns', region).get_topic_attributes(TopicArn=topic_arn)
+    return attributes['Attributes'].get('Policy')
 
-                principal_org_id_found = "PrincipalOrgID" in policy
-
-                if org_id_found or principal_org_id_found:
-                    print(f"Organization ID reference found in policy for topic: {topic_arn}")
-
-            except Exception as e:
-                print(f"An error occurred while checking the policy for topic {topic_arn}: {str(e)}")
+def check_organization_references_in_sns_policy(region,matcher):
+    """Return (topic ARN, matches) for topics in the region whose policy references an organization."""
+    try:
+        topic_arns = list_topic_arns(get_client('sns', region))
+        return scan_resource_policies(
+            topic_arns,
+            lambda topic_arn: get_topic_policy(region, topic_arn),
+            matcher
+        )
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        return []
 
 
 
 def main():
     region = sys.argv[1]
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    check_organization_references_in_sns_policy(region,org_id_pattern)
+    for topic_arn, matches in check_organization_references_in_sns_policy(region,PolicyMatcher()):
+        print(f"Organization reference found in policy for topic: {topic_arn} - {format_matches(matches)}")
+
 
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,49 @@
 import boto3
-import re
-
-
-def check_organization_references_in_sqs_policy(region,org_id_pattern):
+import sys
+from fanout import get_client, scan_resource_policies
+from policy_matcher import PolicyMatcher, format_matches
+
+# ListQueues only returns a NextToken when MaxResults is set
+QUEUE_PAGE_SIZE = 1000
+
+
+def list_queue_urls(sqs_client):
+    """List every SQS queue URL in the client's region, following NextToken."""
+    queue_urls = []
+    paginator = sqs_client.get_paginator('list_queues')
+    for page in paginator.paginate(PaginationConfig={'PageSize': QUEUE_PAGE_SIZE}):
+        queue_urls.extend(page.get('QueueUrls', []))
+    return queue_urls
+
+def get_queue_policy(region, queue_url):
+    # Get the queue attributes, including the policy
+    attributes = get_client('sqs', region).get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=['Policy']
+    )
+    return attributes.get('Attributes', {}).get('Policy')
+
+def check_organization_references_in_sqs_policy(region,matcher):
+    """Return (queue URL, matches) for queues in the region whose policy references an organization."""
     try:
-        sqs_client = boto3.client('sqs', region_name=region)
-        # Get the list of all SQS queue URLs
-        queues_response = sqs_client.list_queues()
-        queue_urls = queues_response.get('QueueUrls', [])
-
-        for queue_url in queue_urls:
-            print(f"Checking policy for queue: {queue_url}")
-
-            try:
-                # Get the queue attributes, including the policy
-                attributes = sqs_client.get_queue_attributes(
-                    QueueUrl=queue_url,
-                    AttributeNames=['Policy']
-                )
-                policy = attributes.get('Attributes', {}).get('Policy', '')
-
-                # Check for any organization ID pattern
-                org_id_found = org_id_pattern.search(policy)
-
-                # Check specifically for the text "PrincipalOrgID"
-                principal_org_id_found = "PrincipalOrgID" in policy
-
-                # Output results based on findings
-                if org_id_found or principal_org_id_found:
-                    print(f"Organization ID reference found in policy for queue: {queue_url}")
-                
-
-            except Exception as e:
-                print(f"An error occurred while checking the policy for queue {queue_url}: {str(e)}")
+        queue_urls = list_queue_urls(get_client('sqs', region))
+        return scan_resource_policies(
+            queue_urls,
+            lambda queue_url: get_queue_policy(region, queue_url),
+            matcher
+        )
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        return []
 
 
 
 def main():
     region = sys.argv[1]
-    org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-    check_organization_references_in_sqs_policy(region,org_id_pattern)
+    for queue_url, matches in check_organization_references_in_sqs_policy(region,PolicyMatcher()):
+        print(f"Organization reference found in policy for queue: {queue_url} - {format_matches(matches)}")
+
 
+if __name__ == "__main__":
+    main()
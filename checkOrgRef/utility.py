@@ -1,53 +1,62 @@
-import boto3
 import datetime
+import os
+import sys
+from fanout import get_client
+from region_selection import DEFAULT_COST_THRESHOLD, sum_costs_by_region, select_regions
 
-all_regions = ['af-south-1','ap-northeast-1','ap-northeast-2','ap-northeast-3','ap-southeast-1',
-               'ap-southeast-2','ap-southeast-3','ap-south-1','ca-central-1','eu-central-1',
-               'eu-north-1','eu-west-1','eu-west-2','eu-west-3','eu-south-1','us-west-1','us-west-2',
-               'us-east-1','us-east-2','sa-east-1','ap-east-1','me-south-1']
+# The region cache lives at the repository root, shared with find_sso_region
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import region_cache
+
+def get_region_costs():
+    """Return the cost of each region over the last 15 days, keyed by region code."""
+    region_costs = region_cache.load_cached(region_cache.REGION_COSTS)
+    if region_costs is not None:
+        return region_costs
 
-def get_regions():
-    final_regions = ''
     end_date = datetime.date.today()
     start_date = end_date - datetime.timedelta(days=15)
-    client = boto3.client('ce',region_name = 'us-east-1')
-    response = client.get_cost_and_usage(
-        TimePeriod={
+    client = get_client('ce', 'us-east-1')
+    request = {
+        'TimePeriod': {
         'Start': str(start_date),
         'End': str(end_date)
         },
-        Metrics=['UnblendedCost'],
-        Granularity='MONTHLY',
-        GroupBy = [
+        'Metrics': ['UnblendedCost'],
+        'Granularity': 'MONTHLY',
+        'GroupBy': [
             {
             'Type': 'DIMENSION',
             'Key': 'REGION'
             },]
-    )
-    result = response['ResultsByTime'][0]['Groups']
-    regions = []
-    regionList = []
-    for i in range(len(result)):
-        cost = float(result[i]['Metrics']['UnblendedCost']['Amount'])
-        region_code = result[i]['Keys']
-        if cost > 1:
-            regions.append(region_code)
-            res = [''.join(ele) for ele in regions]
-            final_regions = [ region for region in res if region in all_regions ]
-
-    regions_list= ",".join(final_regions)
-    regionList.extend(final_regions)
-    print(f'Optimal regions: {final_regions}')
-    print(type(final_regions))
-
-    enabled_regions = []
-    region_list_final = []
-    ec2 = boto3.client('ec2',region_name='us-east-1')
+    }
+
+    # The 15 day window can span two months, so every time period and page counts
+    results_by_time = []
+    while True:
+        response = client.get_cost_and_usage(**request)
+        results_by_time.extend(response['ResultsByTime'])
+        if not response.get('NextPageToken'):
+            break
+        request['NextPageToken'] = response['NextPageToken']
+
+    region_costs = sum_costs_by_region(results_by_time)
+    region_cache.store(region_cache.REGION_COSTS, region_costs)
+    return region_costs
+
+def get_enabled_regions():
+    enabled_regions = region_cache.load_cached(region_cache.ENABLED_REGIONS)
+    if enabled_regions is not None:
+        return enabled_regions
+
+    ec2 = get_client('ec2', 'us-east-1')
     data = ec2.describe_regions()
-    for region in data['Regions']:
-        enabled_regions.append(region['RegionName'])
-    for optimal in regionList:
-        for enabled in enabled_regions:
-            if optimal == enabled:
-                region_list_final.append(optimal)
-    return region_list_final
+    enabled_regions = [region['RegionName'] for region in data['Regions']]
+    region_cache.store(region_cache.ENABLED_REGIONS, enabled_regions)
+    return enabled_regions
+
+def get_regions(cost_threshold=DEFAULT_COST_THRESHOLD):
+    """Return the enabled regions that had more than cost_threshold of spend in the last 15 days."""
+    regions = select_regions(get_region_costs(), get_enabled_regions(), cost_threshold)
+    print(f'Optimal regions: {regions}')
+    return regions
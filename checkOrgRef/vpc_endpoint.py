@@ -1,14 +1,8 @@
 import boto3
-import re
-import json
+from fanout import get_client
+from policy_matcher import PolicyMatcher, format_matches
 
-# Regular expression to match organization IDs
-org_id_pattern = re.compile(r'\bo-[a-zA-Z0-9]{4,32}\b')
-
-# Initialize EC2 client
-ec2_client = boto3.client('ec2')
-
-def get_vpc_endpoints():
+def get_vpc_endpoints(ec2_client):
     """Retrieve a list of all VPC endpoints."""
     endpoints = []
     paginator = ec2_client.get_paginator('describe_vpc_endpoints')
@@ -16,32 +10,31 @@ def get_vpc_endpoints():
         endpoints.extend(page['VpcEndpoints'])
     return endpoints
 
-def check_policy_for_org_id(policy_document):
-    """Check if the policy document contains an org ID or 'PrincipalOrgID'."""
-    policy_str = json.dumps(policy_document)  # Convert policy document to a JSON string
-    if 'PrincipalOrgID' in policy_str or org_id_pattern.search(policy_str):
-        return True
-    return False
-
-def main():
-    print("Fetching VPC endpoints...")
-    endpoints = get_vpc_endpoints()
+def check_organization_references_in_vpc_endpoints(region,matcher):
+    """Return (endpoint ID, matches) for VPC endpoints in the region whose policy references an organization."""
+    ec2_client = get_client('ec2', region)
+    endpoints = get_vpc_endpoints(ec2_client)
     flagged_endpoints = []
 
-    print(f"Found {len(endpoints)} VPC endpoints. Checking for organization IDs...")
     for endpoint in endpoints:
         endpoint_id = endpoint['VpcEndpointId']
-        policy_document = endpoint.get('PolicyDocument')  # VPC endpoint policy
+        policy_document = endpoint.get('PolicyDocument')  # VPC endpoint policy, as returned by the API
+
+        matches = matcher.find(policy_document) if policy_document else []
+        if matches:
+            flagged_endpoints.append((endpoint_id, matches))
 
-        if policy_document and check_policy_for_org_id(policy_document):
-            flagged_endpoints.append(endpoint_id)
+    return flagged_endpoints
 
+def main():
+    region = boto3.Session().region_name
+    flagged_endpoints = check_organization_references_in_vpc_endpoints(region,PolicyMatcher())
     if flagged_endpoints:
-        print("VPC endpoints containing organization IDs or 'PrincipalOrgID' in policies:")
-        for endpoint_id in flagged_endpoints:
-            print(f"- {endpoint_id}")
+        print("VPC endpoints containing organization references in policies:")
+        for endpoint_id, matches in flagged_endpoints:
+            print(f"- {endpoint_id}: {format_matches(matches)}")
     else:
-        print("No VPC endpoints containing organization IDs or 'PrincipalOrgID' in policies were found.")
+        print("No VPC endpoints containing organization references in policies were found.")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,33 @@
-import boto3
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.config import Config
+import region_cache
+from aws_clients import get_client
+
+# Timeouts for a single region probe, so slow or opt-in regions can't hold up discovery
+PROBE_CONNECT_TIMEOUT = 5
+PROBE_READ_TIMEOUT = 10
+MAX_PROBE_WORKERS = 16
+
+# Probe clients come from the shared session, with short timeouts and few retries
+PROBE_CONFIG = Config(
+    connect_timeout=PROBE_CONNECT_TIMEOUT,
+    read_timeout=PROBE_READ_TIMEOUT,
+    retries={'max_attempts': 2}
+)
 
 # List of all AWS regions
 def get_all_regions():
     try:
-        ec2_client = boto3.client('ec2')
+        regions = region_cache.load_cached(region_cache.ENABLED_REGIONS)
+        if regions is not None:
+            return regions
+
+        ec2_client = get_client('ec2')
         response = ec2_client.describe_regions()
-        return [region['RegionName'] for region in response['Regions']]
+        regions = [region['RegionName'] for region in response['Regions']]
+        region_cache.store(region_cache.ENABLED_REGIONS, regions)
+        return regions
     except Exception as e:
         print("Error in get_all_regions:")
         print(traceback.format_exc())
@@ -15,8 +36,8 @@ def get_all_regions():
 # Check if SSO is enabled in the given region
 def check_sso_enabled_in_region(region):
     try:
-        # Initialize the SSO client for the specified region
-        sso_client = boto3.client('sso-admin', region_name=region)
+        # Initialize the SSO client for the specified region, get_client builds clients safely from parallel probes
+        sso_client = get_client('sso-admin', region, PROBE_CONFIG)
         
         # Attempt to list SSO instances (this will work only if SSO is enabled in the region)
         response = sso_client.list_instances()
@@ -32,11 +53,27 @@ def check_sso_enabled_in_region(region):
 
 def find_region_with_sso():
     try:
+        cached_region = region_cache.load_cached(region_cache.SSO_REGION)
+        if cached_region:
+            print(f"SSO is enabled in region: {cached_region} (cached)")
+            return cached_region
+
         regions = get_all_regions()
-        for region in regions:
-            if check_sso_enabled_in_region(region):
-                print(f"SSO is enabled in region: {region}")
-                return region
+
+        # Probe every region at once and stop at the first one that reports an instance
+        executor = ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS)
+        try:
+            futures = {executor.submit(check_sso_enabled_in_region, region): region for region in regions}
+            for future in as_completed(futures):
+                if future.result():
+                    region = futures[future]
+                    print(f"SSO is enabled in region: {region}")
+                    region_cache.store(region_cache.SSO_REGION, region)
+                    return region
+        finally:
+            # Drop probes that haven't started; running ones finish within their timeouts
+            executor.shutdown(wait=False, cancel_futures=True)
+
         print("SSO is not enabled in any region.")
         return None
     except Exception as e:
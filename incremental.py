@@ -0,0 +1,216 @@
+import csv
+import io
+import traceback
+import zipfile
+from datetime import datetime, timedelta
+from archive import COMPRESSION_MODES, open_output
+
+CHANGE_REPORT_FILE = 'changes.csv'
+
+# Output files compared between runs, with the columns that identify a row.
+# Files without a unique column are keyed on the whole row, so rows are only reported as added or removed.
+# RAM.csv lists a resource once per share and owner, so its ARN is not unique either.
+TRACKED_FILES = [
+    ('aws_accounts.csv', ['Account ID']),
+    ('policies.csv', ['Policy ID']),
+    ('RAM.csv', None),
+    ('IdentityCenter/identity_center_users.csv', ['UserId']),
+    ('IdentityCenter/identity_center_groups.csv', ['GroupId']),
+    ('IdentityCenter/identity_center_permission_sets.csv', ['PermissionSetArn']),
+    ('IdentityCenter/identity_center_sso_applications.csv', ['ApplicationArn']),
+    ('IdentityCenter/identity_center_permission_sets_attached_to_account.csv', ['AccountId']),
+    ('IdentityCenter/identity_center_account_assignments.csv', None),
+    ('IdentityCenter/identity_center_group_memberships.csv', None),
+]
+
+# Policy documents are compared as whole files
+POLICY_CONTENT_PREFIX = 'policy_content/'
+
+# Collector stages whose output can be copied from the previous zip instead of collected again, with the
+# members they write. None of these APIs report what changed, so reusing one is the caller's decision.
+REUSABLE_STAGES = {
+    'org_services': ['org_services.csv'],
+    'policies': ['policies.csv', POLICY_CONTENT_PREFIX],
+    'sso': ['IdentityCenter/'],
+    'ram': ['RAM.csv'],
+}
+
+# Cost Explorer keeps adjusting a month's costs for a few days after the month ends
+BILL_SETTLEMENT_DAYS = 5
+
+# Zip timestamp of members written before the archive recorded real times
+_UNKNOWN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+class PreviousAssessment:
+    """Read-only view of the zip written by an earlier run."""
+
+    def __init__(self, zip_file_path):
+        self.zip_file_path = zip_file_path
+        # Read into memory, a rerun for the same organization overwrites this zip with its own output
+        with open(zip_file_path, 'rb') as file:
+            self._zip = zipfile.ZipFile(io.BytesIO(file.read()))
+        self._names = set(self._zip.namelist())
+        # Members are written as the run goes, so the newest timestamp is when the run finished
+        date_times = [info.date_time for info in self._zip.infolist() if info.date_time != _UNKNOWN_DATE_TIME]
+        self.written_at = datetime(*max(date_times)) if date_times else None
+
+    def names(self, prefix=''):
+        return {name for name in self._names if name.startswith(prefix)}
+
+    def read_text(self, name):
+        with self._zip.open(name) as member:
+            return member.read().decode('utf-8')
+
+    def read_csv(self, name):
+        """Return the rows of a CSV member, header first, or None if the earlier run did not write it."""
+        if name not in self._names:
+            return None
+        return list(csv.reader(io.StringIO(self.read_text(name), newline='')))
+
+    def accounts_by_id(self):
+        rows = self.read_csv('aws_accounts.csv')
+        if not rows:
+            return {}
+        header = rows[0]
+        return {row[0]: dict(zip(header, row)) for row in rows[1:] if row}
+
+    def billing_rows(self, accounts, start_date, billing_directory='Billing'):
+        """
+        Return {account ID: billing rows} that can be reused for accounts in this run.
+
+        Only bills for the same month starting at start_date are reused, only if
+        that month had settled in Cost Explorer before the earlier run, and only
+        for accounts whose name and status have not changed since. Empty bills
+        do not show their period, so those accounts are queried again.
+        """
+        period_start = datetime.strptime(start_date, '%Y-%m-%d')
+        period_end = (period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        if self.written_at is None or self.written_at < period_end + timedelta(days=BILL_SETTLEMENT_DAYS):
+            return {}
+
+        previous_accounts = self.accounts_by_id()
+        reusable = {}
+        for account in accounts:
+            previous_account = previous_accounts.get(account['Id'])
+            if previous_account is None:
+                continue
+            if previous_account['Account Name'] != account['Name'] or previous_account['Status'] != account['Status']:
+                continue
+            rows = self.read_csv(f"{billing_directory}/{account['Name']}_{account['Id']}_bill.csv")
+            if rows is None or len(rows) < 2:
+                continue
+            start_date_index = rows[0].index('Start Date')
+            if all(row[start_date_index] == start_date for row in rows[1:] if row):
+                reusable[account['Id']] = rows[1:]
+        return reusable
+
+    def copy_stage_output(self, stage_name, output_directory):
+        """Write the members a reusable stage produced in the earlier run into this run's output, return how many."""
+        prefixes = REUSABLE_STAGES[stage_name]
+        names = sorted(name for name in self._names if name.startswith(tuple(prefixes)))
+        for name in names:
+            with open_output(f'{output_directory}/{name}', mode='w', newline='', encoding='utf-8') as file:
+                file.write(self.read_text(name))
+        return len(names)
+
+    def close(self):
+        self._zip.close()
+
+def _index_rows(rows, key_columns):
+    header, body = rows[0], rows[1:]
+    key_indexes = None
+    if key_columns is not None:
+        key_indexes = [header.index(column) for column in key_columns if column in header]
+        if len(key_indexes) != len(key_columns):
+            # The header changed between versions, fall back to whole-row comparison
+            key_indexes = None
+
+    # A key seen again gets its occurrence number appended, so repeated rows are counted instead of collapsed
+    index = {}
+    occurrences = {}
+    for row in body:
+        if not row or (key_indexes is not None and len(row) != len(header)):
+            continue
+        key = tuple(row) if key_indexes is None else tuple(row[position] for position in key_indexes)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        if occurrences[key] > 1:
+            key = key + (f"#{occurrences[key]}",)
+        index[key] = row
+    return header, index
+
+def diff_csv(name, previous_rows, current_rows, key_columns):
+    """Return change report rows [file, change, key, field, previous, current] for one CSV."""
+    if previous_rows is None and current_rows is None:
+        return []
+    if previous_rows is None:
+        return [[name, 'file added', '', '', '', '']]
+    if current_rows is None:
+        return [[name, 'file removed', '', '', '', '']]
+    if not previous_rows or not current_rows:
+        return [] if previous_rows == current_rows else [[name, 'file changed', '', '', '', '']]
+
+    previous_header, previous_index = _index_rows(previous_rows, key_columns)
+    current_header, current_index = _index_rows(current_rows, key_columns)
+
+    changes = []
+    for key, row in current_index.items():
+        previous_row = previous_index.get(key)
+        if previous_row is None:
+            changes.append([name, 'added', ' / '.join(key), '', '', ' / '.join(row)])
+            continue
+        for field, value in zip(current_header, row):
+            if field in previous_header:
+                previous_value = previous_row[previous_header.index(field)]
+                if previous_value != value:
+                    changes.append([name, 'changed', ' / '.join(key), field, previous_value, value])
+    for key, row in previous_index.items():
+        if key not in current_index:
+            changes.append([name, 'removed', ' / '.join(key), '', ' / '.join(row), ''])
+    return changes
+
+def diff_assessments(previous, current, reused_stages=()):
+    """Compare the tracked CSVs and policy documents of two assessments, skipping output of reused stages."""
+    reused_prefixes = tuple(prefix for stage_name in reused_stages for prefix in REUSABLE_STAGES[stage_name])
+    changes = [[prefix, 'reused, not reassessed', '', '', '', ''] for prefix in reused_prefixes]
+
+    for name, key_columns in TRACKED_FILES:
+        if reused_prefixes and name.startswith(reused_prefixes):
+            continue
+        changes.extend(diff_csv(name, previous.read_csv(name), current.read_csv(name), key_columns))
+
+    if POLICY_CONTENT_PREFIX in reused_prefixes:
+        return changes
+    previous_documents = previous.names(POLICY_CONTENT_PREFIX)
+    current_documents = current.names(POLICY_CONTENT_PREFIX)
+    for name in sorted(current_documents - previous_documents):
+        changes.append([name, 'file added', '', '', '', ''])
+    for name in sorted(previous_documents - current_documents):
+        changes.append([name, 'file removed', '', '', '', ''])
+    for name in sorted(current_documents & previous_documents):
+        if previous.read_text(name) != current.read_text(name):
+            changes.append([name, 'file changed', '', '', '', ''])
+    return changes
+
+def write_change_report(previous, zip_file_path, compression='deflated', reused_stages=()):
+    """Diff a finished output zip against an earlier one and add the change report to it."""
+    try:
+        current = PreviousAssessment(zip_file_path)
+        try:
+            changes = diff_assessments(previous, current, reused_stages)
+        finally:
+            current.close()
+
+        report = io.StringIO(newline='')
+        writer = csv.writer(report)
+        writer.writerow(['File', 'Change', 'Key', 'Field', 'Previous', 'Current'])
+        writer.writerows(changes)
+
+        zip_compression, compresslevel = COMPRESSION_MODES[compression]
+        with zipfile.ZipFile(zip_file_path, 'a', zip_compression, compresslevel=compresslevel) as archive:
+            archive.writestr(CHANGE_REPORT_FILE, report.getvalue())
+
+        print(f"{len(changes)} changes since {previous.zip_file_path}, see {CHANGE_REPORT_FILE} in the output zip")
+        return changes
+    except Exception as e:
+        print("Error while writing the change report:")
+        print(traceback.format_exc())
@@ -1,87 +1,139 @@
 import os
+import argparse
 import boto3
 import boto3.session
 import traceback
 from aws_accounts import get_account_details
+from account_inventory import AccountInventory
 from org_services import get_org_services
 from policies import get_policies
 from sso import get_sso_info
 from billing import get_billing_info
-import zipfile
-import shutil
 from ram import check_for_non_shareable_resources
+from archive import ArchiveSink, COMPRESSION_MODES
+from aws_clients import get_client
+from pipeline import Stage, run_stages
+from incremental import PreviousAssessment, REUSABLE_STAGES, write_change_report
 
 output_directory = ''
 
-def zip_folder(folder_path, zip_file_path):
-    """Zips the contents of an entire folder."""
+def main(compression='deflated', previous_zip=None, reuse=()):
+    previous = None
     try:
-        with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Walk the directory tree
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Write the file to the zip file, but omit the folder structure in the zip
-                    zipf.write(file_path, os.path.relpath(file_path, folder_path))
-
-        print(f"Folder '{folder_path}' zipped successfully as '{zip_file_path}'")
-
-        # Remove the folder as the zip remains
-        shutil.rmtree(folder_path)
+        # Initialize a single boto3 client for AWS Organizations
+        orgClient = get_client('organizations', boto3.Session().region_name)  # Using the current region
+
+        # An earlier output zip to reuse data from and to diff against
+        previous = PreviousAssessment(previous_zip) if previous_zip else None
+
+        # Every collector writes straight into the zip, so there is no folder to package afterwards
+        with ArchiveSink(f'{output_directory}.zip', output_directory, compression):
+            run_collectors(orgClient, previous, reuse)
+
+        if previous is not None:
+            print("\n--- Comparing with the previous assessment ---\n")
+            write_change_report(previous, f'{output_directory}.zip', compression, reuse)
+
+        print(f"Output written successfully to '{output_directory}.zip'")
+
     except Exception as e:
-        print(f"Error in zip_folder for {folder_path}:")
+        print("Error in main execution:")
         print(traceback.format_exc())
         raise
+    finally:
+        if previous is not None:
+            previous.close()
 
-def main():
-    try:
-        # Initialize a single boto3 client for AWS Organizations
-        orgClient = boto3.client('organizations', region_name=boto3.Session().region_name)  # Using the current region
+def build_stages(orgClient, previous=None, reuse=()):
+    """
+    Collector stages for the assessment; stages that need the account list wait only on the inventory.
 
-        # Ensure the output directory exists
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
+    With a previous assessment, settled billing for accounts whose name and
+    status are unchanged is copied from it instead of queried again, and the
+    stages named in reuse copy their earlier output instead of collecting it.
+    """
 
-        # Getting account details
+    def list_accounts():
+        # Listing the organization's accounts once, every collector reads from this inventory
         print("\n--- Getting Accounts related info ---\n")
-        get_account_details(orgClient, output_directory)
+        return AccountInventory.from_organizations(orgClient)
+
+    def export_accounts(inventory):
+        get_account_details(orgClient, output_directory, inventory.accounts)
 
+    def export_org_services():
         # Getting all the org services that are currently enabled
         print("\n--- Checking if Org Based services are in use ---\n")
         get_org_services(orgClient, output_directory)
 
+    def export_policies():
         # Getting the different policies that are enabled at the org level
         print("\n--- Checking if any Policies are in use ---\n")
         policyContentDir = f"{output_directory}/policy_content"
         get_policies(orgClient, output_directory, policyContentDir)
 
+    def export_sso(inventory):
         # Getting SSO-related info into a separate directory
         print("\n--- Checking if SSO is enabled ---\n")
-        get_sso_info(f'{output_directory}/IdentityCenter')
+        get_sso_info(f'{output_directory}/IdentityCenter', inventory.accounts)
 
+    def export_billing(inventory):
         # Getting billing-related info into a separate directory
         print("\n--- Checking Billing data if Org services are enabled ---\n")
-        get_billing_info(f'{output_directory}/Billing')
+        previous_bills = previous.billing_rows if previous is not None else None
+        get_billing_info(f'{output_directory}/Billing', accounts=inventory.accounts, previous_bills=previous_bills)
 
+    def export_ram():
         # Getting RAM-related info
         print("\n--- Checking RAM if any org dependent resources are shared ---\n")
         check_for_non_shareable_resources(output_directory)
 
-        # Zip all contents and remove folder
-        print("\n--- Creating downloadable zip ---\n")
-        zip_folder(folder_path=output_directory, zip_file_path=f'{output_directory}.zip')
+    def reuse_previous_output(stage_name):
+        def copy_previous_output():
+            print(f"\n--- Reusing {stage_name} output from the previous assessment ---\n")
+            copied = previous.copy_stage_output(stage_name, output_directory)
+            print(f"Copied {copied} files")
+        return copy_previous_output
+
+    stages = [
+        Stage('inventory', list_accounts),
+        Stage('accounts', export_accounts, depends_on=['inventory']),
+        Stage('org_services', export_org_services),
+        Stage('policies', export_policies),
+        Stage('sso', export_sso, depends_on=['inventory']),
+        Stage('billing', export_billing, depends_on=['inventory']),
+        Stage('ram', export_ram),
+    ]
+    # Reused stages only copy files, so they don't wait on the inventory either
+    return [Stage(stage.name, reuse_previous_output(stage.name)) if stage.name in reuse else stage for stage in stages]
+
+def run_collectors(orgClient, previous=None, reuse=()):
+    try:
+        # Independent collectors run at the same time, the run takes about as long as the slowest one
+        run_stages(build_stages(orgClient, previous, reuse))
 
     except Exception as e:
-        print("Error in main execution:")
+        print("Error in run_collectors:")
         print(traceback.format_exc())
         raise
 
 if __name__ == "__main__":
     try:
+        parser = argparse.ArgumentParser(description="Assess an AWS organization for billing transfer.")
+        parser.add_argument('--compression', choices=sorted(COMPRESSION_MODES), default='deflated',
+                            help="Compression for the output zip: 'fast' and 'stored' trade size for speed")
+        parser.add_argument('--incremental', metavar='PREVIOUS_ZIP',
+                            help="Output zip of an earlier run: add a changes.csv report against it and reuse its settled billing data")
+        parser.add_argument('--reuse', nargs='+', choices=sorted(REUSABLE_STAGES), default=[], metavar='STAGE',
+                            help="With --incremental, copy these collectors' output from the earlier run instead of collecting it again")
+        args = parser.parse_args()
+        if args.reuse and not args.incremental:
+            parser.error("--reuse needs --incremental PREVIOUS_ZIP")
+
         outputDirInput = input("\n Please enter your organisation's name: ")
         # Output directory, replace spaces with underscores
         output_directory = outputDirInput.replace(' ', '_')
-        main()
+        main(args.compression, args.incremental, args.reuse)
 
         current_directory = os.getcwd()
         print(f"\nPlease download the zip from path : {current_directory}/{output_directory}.zip\n")
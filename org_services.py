@@ -1,5 +1,7 @@
 import csv
 import traceback
+from archive import open_output
+from aws_clients import get_client
 
 def get_org_enabled_services(client):
     """Get the list of AWS services enabled for the organization."""
@@ -21,7 +23,7 @@ def write_services_to_csv(services, file_name):
         header = ['Service Principal', 'Date Enabled']
 
         # Open the CSV file for writing
-        with open(file_name, mode='w', newline='') as file:
+        with open_output(file_name, mode='w', newline='') as file:
             writer = csv.writer(file)
 
             # Write the header
@@ -53,8 +55,8 @@ def get_org_services(client, outputDirectory):
 
 if __name__ == "__main__":
     try:
-        # Assume 'client' and 'outputDirectory' are set elsewhere in the actual implementation
-        client = None  # Replace this with actual boto3 client initialization
+        # Shared Organizations client, with the same retries and rate limiting as the full assessment
+        client = get_client('organizations')
         outputDirectory = 'output'  # Replace with the actual output directory
         get_org_services(client, outputDirectory)
     except Exception as e:
@@ -0,0 +1,76 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class Stage:
+    """A collector step and the names of the stages whose results it needs, passed in that order."""
+
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+def _run_timed(func, args):
+    started = time.perf_counter()
+    try:
+        return func(*args), None, time.perf_counter() - started
+    except Exception as e:
+        print(f"Error in stage {func.__name__}:")
+        print(traceback.format_exc())
+        return None, e, time.perf_counter() - started
+
+def print_timings(timings, total_seconds):
+    print("\n--- Stage timings ---\n")
+    for name, (status, seconds) in timings.items():
+        print(f"{name:<20} {status:<8} {seconds:8.2f}s")
+    print(f"{'Total':<20} {'':<8} {total_seconds:8.2f}s")
+
+def run_stages(stages, max_workers=None):
+    """
+    Run stages on a thread pool, each as soon as the stages it depends on have finished.
+
+    Stages depending on a failed stage are skipped, the rest still run. Timings
+    are printed for every stage and the first error is raised once all are done.
+    Returns the results of all stages keyed by stage name.
+    """
+    pending = {stage.name: stage for stage in stages}
+    results = {}
+    timings = {}
+    failed = set()
+    first_error = None
+    running = {}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages)) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dependency in failed for dependency in stage.depends_on):
+                    del pending[name]
+                    failed.add(name)
+                    timings[name] = ('skipped', 0.0)
+                elif all(dependency in results for dependency in stage.depends_on):
+                    del pending[name]
+                    args = [results[dependency] for dependency in stage.depends_on]
+                    running[executor.submit(_run_timed, stage.func, args)] = name
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Stages with missing dependencies: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, error, seconds = future.result()
+                if error is None:
+                    results[name] = result
+                    timings[name] = ('ok', seconds)
+                else:
+                    failed.add(name)
+                    timings[name] = ('failed', seconds)
+                    first_error = first_error or error
+
+    print_timings(timings, time.perf_counter() - started)
+    if first_error is not None:
+        raise first_error
+    return results
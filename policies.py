@@ -1,47 +1,74 @@
-import boto3
 import csv
 import os
 import json
 import traceback
-
-def get_scp_policies(client):
+from concurrent.futures import ThreadPoolExecutor
+from archive import open_output
+from aws_clients import get_client
+
+# Organizations allows only a few requests per second, so keep the fetch pool small
+# Throttled calls are paced and retried by the shared rate limiter in aws_throttle
+MAX_POLICY_DETAIL_WORKERS = 8
+
+# Policy types listed by get_policies, as (Organizations policy type, label used in policies.csv).
+# Supporting a new policy type only needs an entry here.
+POLICY_TYPES = [
+    ('SERVICE_CONTROL_POLICY', 'SCP'),
+    ('RESOURCE_CONTROL_POLICY', 'RCP'),
+    ('BACKUP_POLICY', 'Backup'),
+    ('TAG_POLICY', 'Tag Policy'),
+    ('AISERVICES_OPT_OUT_POLICY', 'AI Opt-Out Policy'),
+    ('CHATBOT_POLICY', 'Chatbot Policy'),
+    ('DECLARATIVE_POLICY_EC2', 'Declarative Policy'),
+]
+
+def register_policy_type(policy_filter, policy_label):
+    """Add an Organizations policy type to the ones listed by get_policies."""
+    if policy_filter not in [registered for registered, _ in POLICY_TYPES]:
+        POLICY_TYPES.append((policy_filter, policy_label))
+
+def list_policies_of_type(client, policy_filter):
     try:
-        # Get SCP policies from AWS Organizations
-        scp_policies = []
+        # Get every policy of one type from AWS Organizations
+        policies = []
         paginator = client.get_paginator('list_policies')
-        for page in paginator.paginate(Filter='SERVICE_CONTROL_POLICY'):
-            scp_policies.extend(page['Policies'])
-        return scp_policies
+        for page in paginator.paginate(Filter=policy_filter):
+            policies.extend(page['Policies'])
+        return policies
     except Exception as e:
-        print("Error in get_scp_policies:")
+        print(f"Error in list_policies_of_type for {policy_filter}:")
         print(traceback.format_exc())
         raise
 
+def list_policies_of_all_types(client, policy_types=None):
+    """
+    List the policies of every registered type at once, returned as (label, policies) in registry order.
+
+    A type that can't be listed, for example one not enabled in the organization,
+    is logged and left out instead of failing the other types.
+    """
+    policy_types = policy_types or POLICY_TYPES
+
+    def list_type(policy_type):
+        policy_filter, policy_label = policy_type
+        try:
+            return list_policies_of_type(client, policy_filter)
+        except Exception as e:
+            print(f"Skipping {policy_label} policies ({policy_filter}), they could not be listed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(policy_types)) as executor:
+        listed = list(executor.map(list_type, policy_types))
+    return [(policy_label, policies) for (_, policy_label), policies in zip(policy_types, listed) if policies is not None]
+
+def get_scp_policies(client):
+    return list_policies_of_type(client, 'SERVICE_CONTROL_POLICY')
+
 def get_backup_policies(client):
-    try:
-        # Get Backup policies from AWS Organizations
-        backup_policies = []
-        paginator = client.get_paginator('list_policies')
-        for page in paginator.paginate(Filter='BACKUP_POLICY'):
-            backup_policies.extend(page['Policies'])
-        return backup_policies
-    except Exception as e:
-        print("Error in get_backup_policies:")
-        print(traceback.format_exc())
-        raise
+    return list_policies_of_type(client, 'BACKUP_POLICY')
 
 def get_tag_policies(client):
-    try:
-        # AWS Organizations Tag Policies (requires Organizations client)
-        tag_policies = []
-        paginator = client.get_paginator('list_policies')
-        for page in paginator.paginate(Filter='TAG_POLICY'):
-            tag_policies.extend(page['Policies'])
-        return tag_policies
-    except Exception as e:
-        print("Error in get_tag_policies:")
-        print(traceback.format_exc())
-        raise
+    return list_policies_of_type(client, 'TAG_POLICY')
 
 def get_policy_targets(client, policy_id):
     try:
@@ -80,73 +107,72 @@ def get_policy_content(client, policy_id):
 
 def save_policy_content_to_json(policy_name, policy_type, policy_content, output_directory):
     try:
-        # Ensure the policy content directory exists
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
-
         # Construct the filename using the policy name and type
         file_name = f"{policy_type}_{policy_name}.json"
         sanitized_name = file_name.replace(' ', '_')  # Replace spaces with underscores
         file_path = os.path.join(output_directory, sanitized_name)
 
         # Write the policy content to a JSON file
-        with open(file_path, 'w', encoding='utf-8') as json_file:
+        with open_output(file_path, 'w', encoding='utf-8') as json_file:
             json.dump(json.loads(policy_content), json_file, indent=4)
     except Exception as e:
         print(f"Error in save_policy_content_to_json for policy {policy_name}:")
         print(traceback.format_exc())
         raise
 
-def write_policies_to_csv(client, policies, file_name, policy_type, output_dir):
+def get_policy_details(client, policy):
+    """Fetch the targets and content of a single policy."""
+    targets = get_policy_targets(client, policy['Id'])
+    policy_content = get_policy_content(client, policy['Id'])
+    return targets, policy_content
+
+def fetch_policy_details(client, policies, max_workers=MAX_POLICY_DETAIL_WORKERS):
+    """Fetch targets and content for many policies at once, returned in the same order as policies."""
+    if not policies:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(policies))) as executor:
+        return list(executor.map(lambda policy: get_policy_details(client, policy), policies))
+
+def write_policies_to_csv(client, typed_policies, file_name, output_dir):
+    """Write (policy type, policy) pairs to the policies CSV and save each policy's content to JSON."""
     try:
+        # Get the targets and content of every policy, of every type, in one pipeline
+        policy_details = fetch_policy_details(client, [policy for _, policy in typed_policies])
+
         # Open the CSV file for writing
-        with open(file_name, mode='a', newline='', encoding='utf-8') as file:
+        with open_output(file_name, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
 
+            # Write the header with targets and policy content
+            writer.writerow(['Policy ID', 'Policy Name', 'Description', 'Policy Type', 'Targets'])
+
             # Write the policy data with targets and save content to JSON
-            for policy in policies:
+            for (policy_type, policy), (targets, policy_content) in zip(typed_policies, policy_details):
                 policy_id = policy['Id']
                 policy_name = policy['Name']
                 description = policy.get('Description', '')
                 
-                # Get the policy targets
-                targets = get_policy_targets(client, policy_id)
-                
-                # Get the policy content
-                policy_content = get_policy_content(client, policy_id)
-                
                 # Save the policy content to a JSON file
                 save_policy_content_to_json(policy_name, policy_type, policy_content, output_dir)
                 
                 # Write policy details and targets to CSV
                 writer.writerow([policy_id, policy_name, description, policy_type, targets])
     except Exception as e:
-        print(f"Error in write_policies_to_csv for {policy_type} policies:")
+        print(f"Error in write_policies_to_csv for {file_name}:")
         print(traceback.format_exc())
         raise
 
 def get_policies(client, outputDirectory, policyContentDirectory):
     try:
-        # Write the header with targets and policy content
-        header = ['Policy ID', 'Policy Name', 'Description', 'Policy Type', 'Targets']
-        with open(f'{outputDirectory}/policies.csv', mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(header)
-
-        # Step 1: Get SCP policies
-        print("Fetching SCP policies if any...")
-        scp_policies = get_scp_policies(client)
-        write_policies_to_csv(client, scp_policies, f'{outputDirectory}/policies.csv', 'SCP', policyContentDirectory)
-
-        # Step 2: Get Backup policies
-        print("Fetching Backup policies if any...")
-        backup_policies = get_backup_policies(client)
-        write_policies_to_csv(client, backup_policies, f'{outputDirectory}/policies.csv', 'Backup', policyContentDirectory)
+        # Step 1: List the policies of every registered type
+        print("Fetching policies of every type if any...")
+        policies_by_type = list_policies_of_all_types(client)
+        for policy_label, policies in policies_by_type:
+            print(f"Found {len(policies)} {policy_label} policies")
 
-        # Step 3: Get Tag policies
-        print("Fetching Tag policies if any...")
-        tag_policies = get_tag_policies(client)
-        write_policies_to_csv(client, tag_policies, f'{outputDirectory}/policies.csv', 'Tag Policy', policyContentDirectory)
+        # Step 2: Fetch details for all of them and write the CSV and JSON files
+        typed_policies = [(policy_label, policy) for policy_label, policies in policies_by_type for policy in policies]
+        write_policies_to_csv(client, typed_policies, f'{outputDirectory}/policies.csv', policyContentDirectory)
 
         print("CSV files and policy JSON files generated successfully.")
     except Exception as e:
@@ -157,7 +183,7 @@ def get_policies(client, outputDirectory, policyContentDirectory):
 if __name__ == '__main__':
     try:
         # Initialize boto3 client for AWS Organizations
-        client = boto3.client('organizations')
+        client = get_client('organizations')
 
         # Specify the output directory for the CSV
         output_dir = './'
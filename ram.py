@@ -1,13 +1,13 @@
-import boto3
 from botocore.exceptions import ClientError
 import csv
 import traceback
-
-# Initialize the RAM client
-ram_client = boto3.client('ram')
+from concurrent.futures import ThreadPoolExecutor
+from archive import open_output
+from aws_clients import get_client
+from find_sso_region import get_all_regions
 
 # List of AWS resource types that cannot be shared outside the organization
-NON_SHAREABLE_RESOURCE_TYPES = [
+NON_SHAREABLE_RESOURCE_TYPES = frozenset([
     "bedrock:CustomModel",
     "outposts:Outpost",
     "ec2:LocalGatewayRouteTable",
@@ -17,16 +17,23 @@ NON_SHAREABLE_RESOURCE_TYPES = [
     "servicecatalog:AttributeGroup",
     "ec2:CoipPool",
     "ec2:Subnet",
-]
+])
+
+# Resource share ARNs sent in a single list_resources call
+RESOURCE_SHARE_BATCH_SIZE = 20
+MAX_SHARE_EXPANSION_WORKERS = 8
+MAX_REGION_WORKERS = 8
+
+RESOURCE_OWNERS = ['SELF', 'OTHER-ACCOUNTS']
 
-def list_ram_resource_shares(resource_owner):
-    """List all active resource shares."""
+def list_ram_resource_shares(ram_client, resource_owner):
+    """List all active resource shares, following nextToken."""
     try:
-        response = ram_client.get_resource_shares(
-            resourceOwner=resource_owner,  # Resources owned by your account
-            resourceShareStatus='ACTIVE'
-        )
-        return response['resourceShares']
+        resource_shares = []
+        paginator = ram_client.get_paginator('get_resource_shares')
+        for page in paginator.paginate(resourceOwner=resource_owner, resourceShareStatus='ACTIVE'):
+            resource_shares.extend(page['resourceShares'])
+        return resource_shares
     except ClientError as e:
         print(f"Error fetching resource shares: {e}")
         print(traceback.format_exc())
@@ -36,66 +43,74 @@ def list_ram_resource_shares(resource_owner):
         print(traceback.format_exc())
         return []
 
-def list_resources_in_share(resource_share_arn, resource_owner):
-    """List all resources in a given resource share."""
+def list_resources_in_shares(ram_client, resource_share_arns, resource_owner):
+    """List all resources in a batch of resource shares, following nextToken."""
     try:
-        response = ram_client.list_resources(
-            resourceOwner=resource_owner,
-            resourceShareArns=[resource_share_arn]
-        )
-        return response['resources']
+        resources = []
+        paginator = ram_client.get_paginator('list_resources')
+        for page in paginator.paginate(resourceOwner=resource_owner, resourceShareArns=resource_share_arns):
+            resources.extend(page['resources'])
+        return resources
     except ClientError as e:
-        print(f"Error fetching resources for resource share {resource_share_arn}: {e}")
+        print(f"Error fetching resources for resource shares {resource_share_arns}: {e}")
         print(traceback.format_exc())
         return []
     except Exception as e:
-        print("Unexpected error in list_resources_in_share:")
+        print("Unexpected error in list_resources_in_shares:")
         print(traceback.format_exc())
         return []
 
-def check_for_non_shareable_resources(output_directory):
+def list_shared_resources(ram_client, resource_owner):
+    """List the resources of every active share for one resource owner, expanding share batches concurrently."""
+    resource_share_arns = [share['resourceShareArn'] for share in list_ram_resource_shares(ram_client, resource_owner)]
+    batches = [
+        resource_share_arns[start:start + RESOURCE_SHARE_BATCH_SIZE]
+        for start in range(0, len(resource_share_arns), RESOURCE_SHARE_BATCH_SIZE)
+    ]
+    if not batches:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_SHARE_EXPANSION_WORKERS, len(batches))) as executor:
+        batch_resources = executor.map(lambda batch: list_resources_in_shares(ram_client, batch, resource_owner), batches)
+        return [resource for resources in batch_resources for resource in resources]
+
+def list_shared_resources_in_region(region):
+    """List the shared resources of both resource owners in one region, with a lazily built regional client."""
+    ram_client = get_client('ram', region)
+    return [resource for resource_owner in RESOURCE_OWNERS for resource in list_shared_resources(ram_client, resource_owner)]
+
+def check_for_non_shareable_resources(output_directory, regions=None):
     """Check if any resource shares with resource owner as SELF/OTHER-ACCOUNTS include resources that are in the NON_SHAREABLE_RESOURCE_TYPES list."""
     try:
-        resource_shares_self = list_ram_resource_shares(resource_owner='SELF')
-        resource_shares_other_accounts = list_ram_resource_shares(resource_owner='OTHER-ACCOUNTS')
+        # RAM is regional, so every enabled region has its own shares
+        if regions is None:
+            regions = get_all_regions()
+
+        # Scan the regions concurrently, results stay in region order
+        with ThreadPoolExecutor(max_workers=MAX_REGION_WORKERS) as executor:
+            region_resources = executor.map(list_shared_resources_in_region, regions)
+            shared_resources = [
+                (region, resource)
+                for region, resources in zip(regions, region_resources)
+                for resource in resources
+            ]
 
-        # if not resource_shares_self and not resource_shares_other_accounts:
-        #     print("No active resource shares found!")
-        #     return
-        if resource_shares_self or resource_shares_other_accounts:
+        if shared_resources:
         # Exporting data to CSV as resource share is found
             print("Resource Shares found")
-            header = ['Resource Type', 'Resource ARN', 'ORG Dependency']
-            with open(f'{output_directory}/RAM.csv', mode='w', newline='', encoding='utf-8') as file:
+            header = ['Resource Type', 'Resource ARN', 'ORG Dependency', 'Region']
+            with open_output(f'{output_directory}/RAM.csv', mode='w', newline='', encoding='utf-8') as file:
                 writer = csv.writer(file)
                 writer.writerow(header)
 
-                for share in resource_shares_self:
-                    resource_share_arn = share['resourceShareArn']
-                    resources = list_resources_in_share(resource_share_arn, resource_owner='SELF')
-
-                    for resource in resources:
-                        resource_type = resource['type']
-                        resource_arn = resource['arn']
-
-                        if resource_type in NON_SHAREABLE_RESOURCE_TYPES:
-                            writer.writerow([resource_type, resource_arn, 'Yes'])
-                        else:
-                            writer.writerow([resource_type, resource_arn, 'No'])
-
-                # Check if any resource shares with resource owner as OTHER-ACCOUNTS include resources that are in the NON_SHAREABLE_RESOURCE_TYPES list.
-                for share in resource_shares_other_accounts:
-                    resource_share_arn = share['resourceShareArn']
-                    resources = list_resources_in_share(resource_share_arn, resource_owner='OTHER-ACCOUNTS')
-
-                    for resource in resources:
-                        resource_type = resource['type']
-                        resource_arn = resource['arn']
+                for region, resource in shared_resources:
+                    resource_type = resource['type']
+                    resource_arn = resource['arn']
 
-                        if resource_type in NON_SHAREABLE_RESOURCE_TYPES:
-                            writer.writerow([resource_type, resource_arn, 'Yes'])
-                        else:
-                            writer.writerow([resource_type, resource_arn, 'No'])
+                    if resource_type in NON_SHAREABLE_RESOURCE_TYPES:
+                        writer.writerow([resource_type, resource_arn, 'Yes', region])
+                    else:
+                        writer.writerow([resource_type, resource_arn, 'No', region])
         else:
             print("No Resource shares active")
 
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+import traceback
+from aws_clients import get_client
+
+# Directory for results kept between runs, override with CK_ASSESSOR_CACHE_DIR
+CACHE_DIRECTORY = os.environ.get('CK_ASSESSOR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.ck_assessor'))
+REGION_CACHE_FILE = os.path.join(CACHE_DIRECTORY, 'region_cache.json')
+
+# How long cached region discovery stays valid, in seconds (default one day)
+REGION_CACHE_TTL = int(os.environ.get('CK_REGION_CACHE_TTL', 24 * 60 * 60))
+
+# Keys stored per account
+ENABLED_REGIONS = 'enabled_regions'
+SSO_REGION = 'sso_region'
+REGION_COSTS = 'region_costs'  # per-region cost, so the cost-active set can use any threshold
+
+_cache_lock = threading.Lock()
+_account_id = None
+
+def get_account_id():
+    """Return the ID of the account the current credentials belong to."""
+    global _account_id
+    if _account_id is None:
+        _account_id = get_client('sts').get_caller_identity()['Account']
+    return _account_id
+
+def _read_cache_file():
+    try:
+        with open(REGION_CACHE_FILE, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (ValueError, OSError):
+        # A corrupt cache is only a missed shortcut, discovery runs again
+        print(f"Ignoring unreadable region cache {REGION_CACHE_FILE}")
+        return {}
+
+def _write_cache_file(cache):
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    temp_file = f"{REGION_CACHE_FILE}.{os.getpid()}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        json.dump(cache, file, indent=4)
+    os.replace(temp_file, REGION_CACHE_FILE)
+
+def load_cached(key, account_id=None):
+    """Return the cached value for key, or None if it is missing or older than REGION_CACHE_TTL."""
+    try:
+        account_id = account_id or get_account_id()
+        with _cache_lock:
+            entry = _read_cache_file().get(account_id, {}).get(key)
+        if entry is None or time.time() - entry['cached_at'] > REGION_CACHE_TTL:
+            return None
+        return entry['value']
+    except Exception as e:
+        print(f"Error reading region cache for {key}:")
+        print(traceback.format_exc())
+        return None
+
+def store(key, value, account_id=None):
+    """Cache a discovered value for the account."""
+    try:
+        account_id = account_id or get_account_id()
+        with _cache_lock:
+            cache = _read_cache_file()
+            cache.setdefault(account_id, {})[key] = {'value': value, 'cached_at': time.time()}
+            _write_cache_file(cache)
+    except Exception as e:
+        print(f"Error writing region cache for {key}:")
+        print(traceback.format_exc())
+
+def invalidate(account_id=None, key=None):
+    """Drop cached entries: one key, everything for one account, or the whole cache if neither is given."""
+    with _cache_lock:
+        cache = _read_cache_file()
+        if account_id is None:
+            cache = {}
+        elif key is None:
+            cache.pop(account_id, None)
+        else:
+            cache.get(account_id, {}).pop(key, None)
+        _write_cache_file(cache)
+
+if __name__ == "__main__":
+    try:
+        invalidate()
+        print(f"Region cache cleared: {REGION_CACHE_FILE}")
+    except Exception as e:
+        print("An error occurred in the main program:")
+        print(traceback.format_exc())
@@ -1,10 +1,20 @@
-import os
 import boto3
 import csv
 from botocore.exceptions import NoCredentialsError, ClientError
 from find_sso_region import find_region_with_sso
 from aws_accounts import get_aws_accounts
+import threading
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from archive import open_output
+from aws_clients import get_client
+
+# Accounts scanned at once when counting provisioned permission sets
+MAX_ACCOUNT_SCAN_WORKERS = 8
+
+# Futures of permission set metadata by ARN, each ARN repeats across many accounts so it is described only once
+_permission_set_cache = {}
+_permission_set_cache_lock = threading.Lock()
 
 def get_user_details_and_export_to_csv(identity_store_client, csv_file, identity_store_id):
     """
@@ -13,31 +23,37 @@ def get_user_details_and_export_to_csv(identity_store_client, csv_file, identity
     :param csv_file: The path of the CSV file to write the user info.
     """
     try:
-        users_response = identity_store_client.list_users(
-            IdentityStoreId=identity_store_id
-        )
-
-        users = users_response.get('Users', [])
-        if not users:
+        file = None
+        try:
+            # Write each page as it arrives so memory stays flat for large directories
+            paginator = identity_store_client.get_paginator('list_users')
+            for page in paginator.paginate(IdentityStoreId=identity_store_id):
+                users = page.get('Users', [])
+
+                # Prepare the CSV file for writing once the first user shows up
+                if users and file is None:
+                    file = open_output(csv_file, mode='w', newline='', encoding='utf-8')
+                    writer = csv.writer(file)
+                    # Write the header row
+                    writer.writerow(['UserName', 'DisplayName', 'Email', 'UserId'])
+
+                # Write user details to the CSV file
+                for user in users:
+                    user_id = user.get('UserId', 'N/A')
+                    user_name = user.get('UserName', 'N/A')
+                    display_name = user.get('DisplayName', 'N/A')
+                    email = user.get('Emails', [{'Value': 'N/A'}])[0]['Value']
+
+                    # Write the user row
+                    writer.writerow([user_name, display_name, email, user_id])
+        finally:
+            if file is not None:
+                file.close()
+
+        if file is None:
             print("No users found in the Identity Center.")
             return
 
-        # Prepare the CSV file for writing
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            # Write the header row
-            writer.writerow(['UserName', 'DisplayName', 'Email', 'UserId'])
-
-            # Write user details to the CSV file
-            for user in users:
-                user_id = user.get('UserId', 'N/A')
-                user_name = user.get('UserName', 'N/A')
-                display_name = user.get('DisplayName', 'N/A')
-                email = user.get('Emails', [{'Value': 'N/A'}])[0]['Value']
-
-                # Write the user row
-                writer.writerow([user_name, display_name, email, user_id])
-
         print(f"User info exported successfully to CSV.")
 
     except NoCredentialsError:
@@ -49,38 +65,76 @@ def get_user_details_and_export_to_csv(identity_store_client, csv_file, identity
         print(f"Unexpected error in get_user_details_and_export_to_csv: {e}")
         print(traceback.format_exc())
 
-def get_groups_and_export_to_csv(identity_store_client, csv_file, identity_store_id):
+def write_group_memberships(executor, identity_store_client, identity_store_id, groups, writer):
+    """Write the members of one page of groups, fetched concurrently on executor, in group order."""
+    group_memberships = executor.map(
+        lambda group: list_group_memberships(identity_store_client, identity_store_id, group['GroupId']),
+        groups
+    )
+    for group, memberships in zip(groups, group_memberships):
+        for membership in memberships:
+            writer.writerow([
+                group.get('DisplayName', 'N/A'),
+                group['GroupId'],
+                membership.get('MemberId', {}).get('UserId', 'N/A')
+            ])
+
+def get_groups_and_export_to_csv(identity_store_client, csv_file, identity_store_id, memberships_csv_file=None):
     """
     Fetches group details from AWS Identity Center (SSO) and exports them to a CSV file.
     
     :param csv_file: The path of the CSV file to write the group info.
     :param identity_store_id: The Identity Store ID.
+    :param memberships_csv_file: If given, the members of each page of groups are written here as the page is
+                                 streamed, so the directory is only walked once.
     """
     try:
-        groups_response = identity_store_client.list_groups(
-            IdentityStoreId=identity_store_id
-        )
-
-        groups = groups_response.get('Groups', [])
-        if not groups:
+        file = None
+        memberships_file = None
+        executor = ThreadPoolExecutor(max_workers=MAX_ACCOUNT_SCAN_WORKERS) if memberships_csv_file else None
+        try:
+            # Write each page as it arrives so memory stays flat for large directories
+            paginator = identity_store_client.get_paginator('list_groups')
+            for page in paginator.paginate(IdentityStoreId=identity_store_id):
+                groups = page.get('Groups', [])
+
+                # Prepare the CSV file for writing once the first group shows up
+                if groups and file is None:
+                    file = open_output(csv_file, mode='w', newline='', encoding='utf-8')
+                    writer = csv.writer(file)
+                    # Write the header row
+                    writer.writerow(['GroupName', 'GroupId'])
+
+                    if memberships_csv_file:
+                        memberships_file = open_output(memberships_csv_file, mode='w', newline='', encoding='utf-8')
+                        memberships_writer = csv.writer(memberships_file)
+                        memberships_writer.writerow(['GroupName', 'GroupId', 'MemberUserId'])
+
+                # Write group details to the CSV file
+                for group in groups:
+                    group_name = group.get('DisplayName', 'N/A')
+                    group_id = group.get('GroupId', 'N/A')
+
+                    # Write the group row
+                    writer.writerow([group_name, group_id])
+
+                if memberships_file is not None and groups:
+                    write_group_memberships(executor, identity_store_client, identity_store_id, groups, memberships_writer)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if file is not None:
+                file.close()
+            if memberships_file is not None:
+                memberships_file.close()
+
+        if file is None:
             print("No groups found in the Identity Center.")
             return
 
-        # Prepare the CSV file for writing
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            # Write the header row
-            writer.writerow(['GroupName', 'GroupId'])
-
-            # Write group details to the CSV file
-            for group in groups:
-                group_name = group.get('DisplayName', 'N/A')
-                group_id = group.get('GroupId', 'N/A')
-
-                # Write the group row
-                writer.writerow([group_name, group_id])
-
         print(f"Group info exported successfully to CSV.")
+        if memberships_file is not None:
+            print(f"Group membership info exported successfully to CSV.")
 
     except NoCredentialsError:
         print("AWS credentials not found. Please configure your AWS CLI.")
@@ -109,7 +163,7 @@ def get_permission_sets_and_export_to_csv(sso_client, csv_file, instance_arn):
             return
 
         # Prepare the CSV file for writing
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
+        with open_output(csv_file, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             # Write the header row
             writer.writerow(['PermissionSetArn'])
@@ -147,7 +201,7 @@ def get_sso_applications_and_export_to_csv(sso_client, csv_file, instance_arn):
             return
 
         # Prepare the CSV file for writing
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
+        with open_output(csv_file, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             # Write the header row
             writer.writerow(['ApplicationArn', 'DisplayName', 'Status'])
@@ -172,38 +226,97 @@ def get_sso_applications_and_export_to_csv(sso_client, csv_file, instance_arn):
         print(f"Unexpected error in get_sso_applications_and_export_to_csv: {e}")
         print(traceback.format_exc())
 
-def get_account_permission_sets_and_export_to_csv(sso_client, csv_file, instance_arn):
+def list_permission_sets_provisioned_to_account(sso_client, instance_arn, account_id):
+    """Returns the ARNs of every permission set provisioned to an account, following NextToken."""
+    permission_sets = []
+    paginator = sso_client.get_paginator('list_permission_sets_provisioned_to_account')
+    for page in paginator.paginate(AccountId=account_id, InstanceArn=instance_arn):
+        permission_sets.extend(page.get('PermissionSets', []))
+    return permission_sets
+
+def list_permission_sets_for_accounts(sso_client, instance_arn, accounts):
+    """Returns the provisioned permission set ARNs of every account, fetched concurrently, in account order."""
+    with ThreadPoolExecutor(max_workers=MAX_ACCOUNT_SCAN_WORKERS) as executor:
+        return list(executor.map(
+            lambda account: list_permission_sets_provisioned_to_account(sso_client, instance_arn, account['Id']),
+            accounts
+        ))
+
+def describe_permission_set(sso_client, instance_arn, permission_set_arn):
+    """
+    Returns a permission set's metadata, calling describe_permission_set at most once per ARN.
+
+    The first caller for an ARN fetches it while concurrent callers wait on the
+    same future. A failed call is not cached, so a later caller tries again.
+    """
+    with _permission_set_cache_lock:
+        future = _permission_set_cache.get(permission_set_arn)
+        is_owner = future is None
+        if is_owner:
+            future = _permission_set_cache[permission_set_arn] = Future()
+
+    if is_owner:
+        try:
+            future.set_result(sso_client.describe_permission_set(
+                InstanceArn=instance_arn,
+                PermissionSetArn=permission_set_arn
+            )['PermissionSet'])
+        except Exception as e:
+            with _permission_set_cache_lock:
+                del _permission_set_cache[permission_set_arn]
+            future.set_exception(e)
+    return future.result()
+
+def list_account_assignments(sso_client, instance_arn, account_id, permission_set_arn):
+    """Returns every principal assigned to an account through a permission set, following NextToken."""
+    assignments = []
+    paginator = sso_client.get_paginator('list_account_assignments')
+    for page in paginator.paginate(InstanceArn=instance_arn, AccountId=account_id, PermissionSetArn=permission_set_arn):
+        assignments.extend(page.get('AccountAssignments', []))
+    return assignments
+
+def list_group_memberships(identity_store_client, identity_store_id, group_id):
+    """Returns the memberships of a group, following NextToken."""
+    memberships = []
+    paginator = identity_store_client.get_paginator('list_group_memberships')
+    for page in paginator.paginate(IdentityStoreId=identity_store_id, GroupId=group_id):
+        memberships.extend(page.get('GroupMemberships', []))
+    return memberships
+
+def get_account_permission_sets_and_export_to_csv(sso_client, csv_file, instance_arn, accounts=None, account_permission_sets=None):
     """
     Fetches permission sets attached to AWS accounts and exports them to a CSV file.
     
     :param csv_file: The path of the CSV file to write the permission set info.
     :param instance_arn: The Identity Center Instance ARN.
+    :param accounts: Accounts already listed from AWS Organizations, fetched here if not given.
+    :param account_permission_sets: Permission set ARNs per account, in account order, fetched here if not given.
     """
     try:
         # Getting all aws accounts
-        accounts = get_aws_accounts(boto3.client('organizations'))
+        if accounts is None:
+            accounts = get_aws_accounts(get_client('organizations'))
+
+        # Fetch every account's permission sets at once, results stay in account order
+        if account_permission_sets is None:
+            account_permission_sets = list_permission_sets_for_accounts(sso_client, instance_arn, accounts)
 
         # Initialize number of applications required post transition to 0
         number_of_applications_required = 0 
 
         # Prepare the CSV file for writing
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
+        with open_output(csv_file, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             # Write the header row
             writer.writerow(['AccountId', 'PermissionSetCount'])
 
-            for account in accounts:
-                acc_id = account['Id']
-                permission_set_response = sso_client.list_permission_sets_provisioned_to_account(
-                    AccountId=acc_id,
-                    InstanceArn=instance_arn    
-                )
-                permission_set_count = len(permission_set_response['PermissionSets'])
+            for account, permission_sets in zip(accounts, account_permission_sets):
+                permission_set_count = len(permission_sets)
                 
                 # Incrementing number of applications required as per the found permission sets
                 number_of_applications_required += permission_set_count
 
-                writer.writerow([acc_id, permission_set_count])
+                writer.writerow([account['Id'], permission_set_count])
             
             # Appending final number of applications required
             writer.writerow(['Total applications required', number_of_applications_required])
@@ -219,10 +332,117 @@ def get_account_permission_sets_and_export_to_csv(sso_client, csv_file, instance
         print(f"Unexpected error in get_account_permission_sets_and_export_to_csv: {e}")
         print(traceback.format_exc())
 
+def get_account_assignments_and_export_to_csv(sso_client, csv_file, instance_arn, accounts=None, account_permission_sets=None):
+    """
+    Fetches who is assigned to each account through which permission set and exports the matrix to a CSV file.
+    
+    :param csv_file: The path of the CSV file to write the assignment info.
+    :param instance_arn: The Identity Center Instance ARN.
+    :param accounts: Accounts already listed from AWS Organizations, fetched here if not given.
+    :param account_permission_sets: Permission set ARNs per account, in account order, fetched here if not given.
+    """
+    try:
+        if accounts is None:
+            accounts = get_aws_accounts(get_client('organizations'))
+        if account_permission_sets is None:
+            account_permission_sets = list_permission_sets_for_accounts(sso_client, instance_arn, accounts)
+
+        # Every (account, permission set) pair needs its own list_account_assignments call
+        pairs = [
+            (account, permission_set_arn)
+            for account, permission_sets in zip(accounts, account_permission_sets)
+            for permission_set_arn in permission_sets
+        ]
+        if not pairs:
+            print("No account assignments found in the Identity Center.")
+            return
+
+        def fetch_assignments(pair):
+            account, permission_set_arn = pair
+            permission_set = describe_permission_set(sso_client, instance_arn, permission_set_arn)
+            assignments = list_account_assignments(sso_client, instance_arn, account['Id'], permission_set_arn)
+            return permission_set, assignments
+
+        with ThreadPoolExecutor(max_workers=MAX_ACCOUNT_SCAN_WORKERS) as executor:
+            pair_assignments = list(executor.map(fetch_assignments, pairs))
+
+        # Prepare the CSV file for writing
+        with open_output(csv_file, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            # Write the header row
+            writer.writerow(['AccountId', 'AccountName', 'PermissionSetName', 'PermissionSetArn', 'PrincipalType', 'PrincipalId'])
+
+            for (account, permission_set_arn), (permission_set, assignments) in zip(pairs, pair_assignments):
+                for assignment in assignments:
+                    writer.writerow([
+                        account['Id'],
+                        account['Name'],
+                        permission_set.get('Name', 'N/A'),
+                        permission_set_arn,
+                        assignment.get('PrincipalType', 'N/A'),
+                        assignment.get('PrincipalId', 'N/A')
+                    ])
+
+        print(f"Account assignment info exported successfully to CSV.")
+
+    except NoCredentialsError:
+        print("AWS credentials not found. Please configure your AWS CLI.")
+    except ClientError as e:
+        print(f"An error occurred while fetching account assignments: {e}")
+        print(traceback.format_exc())
+    except Exception as e:
+        print(f"Unexpected error in get_account_assignments_and_export_to_csv: {e}")
+        print(traceback.format_exc())
+
+def get_group_memberships_and_export_to_csv(identity_store_client, csv_file, identity_store_id):
+    """
+    Fetches the members of every Identity Center group and exports them to a CSV file.
+    
+    :param csv_file: The path of the CSV file to write the membership info.
+    :param identity_store_id: The Identity Store ID.
+    """
+    try:
+        file = None
+        # Members are fetched and written page by page of groups, so memory stays flat like the group export
+        with ThreadPoolExecutor(max_workers=MAX_ACCOUNT_SCAN_WORKERS) as executor:
+            try:
+                paginator = identity_store_client.get_paginator('list_groups')
+                for page in paginator.paginate(IdentityStoreId=identity_store_id):
+                    groups = page.get('Groups', [])
+                    if not groups:
+                        continue
+
+                    # Prepare the CSV file for writing once the first group shows up
+                    if file is None:
+                        file = open_output(csv_file, mode='w', newline='', encoding='utf-8')
+                        writer = csv.writer(file)
+                        # Write the header row
+                        writer.writerow(['GroupName', 'GroupId', 'MemberUserId'])
+
+                    write_group_memberships(executor, identity_store_client, identity_store_id, groups, writer)
+            finally:
+                if file is not None:
+                    file.close()
+
+        if file is None:
+            print("No groups found in the Identity Center.")
+            return
+
+        print(f"Group membership info exported successfully to CSV.")
+
+    except NoCredentialsError:
+        print("AWS credentials not found. Please configure your AWS CLI.")
+    except ClientError as e:
+        print(f"An error occurred while fetching group memberships: {e}")
+        print(traceback.format_exc())
+    except Exception as e:
+        print(f"Unexpected error in get_group_memberships_and_export_to_csv: {e}")
+        print(traceback.format_exc())
+
 if __name__ == '__main__': 
     try:
         # Initialize the boto3 client for AWS Identity Center
-        sso_client = boto3.client('sso-admin')
+        sso_client = get_client('sso-admin')
         response = sso_client.list_instances()
         if response['Instances']:
             print('SSO enabled in current region, skipping region checks!')
@@ -235,8 +455,8 @@ if __name__ == '__main__':
 
         if sso_region:
             # Create required clients
-            sso_client = boto3.client('sso-admin', region_name=sso_region)
-            identity_store_client = boto3.client('identitystore', sso_region)
+            sso_client = get_client('sso-admin', sso_region)
+            identity_store_client = get_client('identitystore', sso_region)
             
             # Fetch Identity Center Instance and Identity Store ID
             instances_response = sso_client.list_instances()
@@ -268,19 +488,16 @@ if __name__ == '__main__':
         print(f"Unexpected error in main: {e}")
         print(traceback.format_exc())
 
-def get_sso_info(outputDirectory):
+def get_sso_info(outputDirectory, accounts=None):
     """
     Retrieves SSO information and exports it to CSV files in the specified directory.
     
     :param outputDirectory: The directory where the CSV files will be saved.
+    :param accounts: Accounts already listed from AWS Organizations, fetched again if not given.
     """
     try:
-        # Creating directories if they don't exist
-        if not os.path.exists(outputDirectory):
-            os.makedirs(outputDirectory)
-
         # Checking if sso is enabled in current region
-        sso_client = boto3.client('sso-admin')
+        sso_client = get_client('sso-admin')
         response = sso_client.list_instances()
         if response['Instances']:
             sso_region = boto3.Session().region_name
@@ -293,8 +510,8 @@ def get_sso_info(outputDirectory):
         if sso_region:
             try:
                 # Create required clients
-                sso_client = boto3.client('sso-admin', region_name=sso_region)
-                identity_store_client = boto3.client('identitystore', sso_region)
+                sso_client = get_client('sso-admin', sso_region)
+                identity_store_client = get_client('identitystore', sso_region)
                 
                 # Fetch Identity Center Instance and Identity Store ID
                 instances_response = sso_client.list_instances()
@@ -307,12 +524,13 @@ def get_sso_info(outputDirectory):
                 permission_set_csv_file = f'{outputDirectory}/identity_center_permission_sets.csv'
                 sso_applications_csv_file = f'{outputDirectory}/identity_center_sso_applications.csv'
                 account_permission_set_count_csv_file = f'{outputDirectory}/identity_center_permission_sets_attached_to_account.csv'
+                account_assignments_csv_file = f'{outputDirectory}/identity_center_account_assignments.csv'
+                group_memberships_csv_file = f'{outputDirectory}/identity_center_group_memberships.csv'
                 
-                # Export users
-                get_user_details_and_export_to_csv(identity_store_client, user_csv_file, identity_store_id)
-
-                # Export groups
-                get_groups_and_export_to_csv(identity_store_client, group_csv_file, identity_store_id)
+                # Export users alongside groups, group members are fetched page by page as the groups stream by
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    executor.submit(get_user_details_and_export_to_csv, identity_store_client, user_csv_file, identity_store_id)
+                    executor.submit(get_groups_and_export_to_csv, identity_store_client, group_csv_file, identity_store_id, group_memberships_csv_file)
 
                 # Export permission sets
                 get_permission_sets_and_export_to_csv(sso_client, permission_set_csv_file, identity_center_instance_arn)
@@ -320,8 +538,22 @@ def get_sso_info(outputDirectory):
                 # Export SSO applications
                 get_sso_applications_and_export_to_csv(sso_client, sso_applications_csv_file, identity_center_instance_arn)
 
-                # Export permission sets attached to accounts
-                get_account_permission_sets_and_export_to_csv(sso_client, account_permission_set_count_csv_file, identity_center_instance_arn)
+                # Fetch the permission sets of every account once, both account exports below use them
+                try:
+                    if accounts is None:
+                        accounts = get_aws_accounts(get_client('organizations'))
+                    account_permission_sets = list_permission_sets_for_accounts(sso_client, identity_center_instance_arn, accounts)
+                except Exception as e:
+                    print(f"Failed to list the permission sets provisioned to accounts, skipping the account exports: {e}")
+                    print(traceback.format_exc())
+                    account_permission_sets = None
+
+                if account_permission_sets is not None:
+                    # Export permission sets attached to accounts
+                    get_account_permission_sets_and_export_to_csv(sso_client, account_permission_set_count_csv_file, identity_center_instance_arn, accounts, account_permission_sets)
+
+                    # Export the account x permission set x principal assignment matrix
+                    get_account_assignments_and_export_to_csv(sso_client, account_assignments_csv_file, identity_center_instance_arn, accounts, account_permission_sets)
 
             except Exception as e:
                 print(f"Failed to retrieve Identity Center instances: {e}")